@@ -1,167 +1,1135 @@
 import requests as rq
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
 from pycorenlp import StanfordCoreNLP
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+from collections import Counter
+from operator import itemgetter
+from contextlib import contextmanager
+from abc import ABC, abstractmethod
+import contextvars
+import threading
+import sys
+import bisect
+import hashlib
+import heapq
+import mmap
+import queue
 import json
+import os
 import re
+import sqlite3
+import time
+
+try:  # если установлен lxml, страницы с текстами серий разбираются с его помощью (это быстрее)
+    import lxml  # noqa: F401
+    TRANSCRIPT_PARSER = 'lxml'
+except ImportError:
+    TRANSCRIPT_PARSER = 'html.parser'
 
 nlp_wrapper = StanfordCoreNLP('http://localhost:9000')
 # java -mx4g -cp "*" edu.stanford.nlp.pipeline.StanfordCoreNLPServer -timeout 10000000 -annotators tokenize
 # -tokenize.options "splitHyphenated=false" # слова с дефисом пока не разделяются на отдельные составляющие
 
 
+# создаем множество частей речи, которые не нужны для словаря (предлоги, частицы, имена собственные и т. д.)
+POS_DELETION_SET = frozenset(['PRP', 'DT', 'IN', 'TO', 'NNP', 'CC', 'CD', 'EX', 'JJR', 'JJS', 'LS', 'MD', 'PDT', 'RP',
+                              'PRP$', 'RBR', 'RBS', 'UH', 'WDT', 'WP', 'WP$', 'WRB', 'NNPS', 'POS', 'SYM'])
+DIGIT_PATTERN = re.compile(r'\d')
+LATIN_LETTER_PATTERN = re.compile(r'[a-zA-Z]')
+STRETCHED_WORD_PATTERN = re.compile(r'\w-\w-')
+
+ANNOTATION_PROPERTIES = {
+    'annotators': 'pos, lemma, depparse',
+    'outputFormat': 'JSON',
+    'timeout': 100000000000,
+}
+
+
+# Функция для записи файла целиком: сначала пишется временный файл, который затем заменяет нужный, поэтому при
+# прерывании работы программы не остается наполовину записанных файлов
+def write_file_atomically(path, text):
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as temporary_file:
+        temporary_file.write(text)
+    os.replace(temporary_path, path)
+
+
+current_episode = contextvars.ContextVar('current_episode', default=None)  # серия, которая сейчас обрабатывается
+
+
+# Класс для сбора статистики по этапам обработки: для каждого этапа (и для каждой серии, если она известна) считаются
+# время работы в секундах (seconds), число вызовов (calls), запросов к серверам (requests), попаданий в кэш
+# (cache_hits) и объем данных в байтах (bytes). Время этапа включает время вложенных в него этапов, а для этапов,
+# которые выполняются в нескольких потоках одновременно, время складывается по всем потокам
+class PipelineStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.stages = {}  # словарь вида {этап: Counter}
+        self.episodes = {}  # словарь вида {номер серии: {этап: Counter}}
+
+    # Добавление значений счетчиков к этапу; если серия не указана, берется серия из объемлющего stats.stage
+    def add(self, stage_name, episode=None, **counters):
+        if episode is None:
+            episode = current_episode.get()
+        with self.lock:
+            self.stages.setdefault(stage_name, Counter()).update(counters)
+            if episode is not None:
+                self.episodes.setdefault(episode, {}).setdefault(stage_name, Counter()).update(counters)
+
+    # Замер времени этапа: with stats.stage('этап', номер серии) as record: ... record(requests=1)
+    @contextmanager
+    def stage(self, stage_name, episode=None):
+        token = current_episode.set(episode) if episode is not None else None
+        started = time.perf_counter()
+        try:
+            yield lambda **counters: self.add(stage_name, episode, **counters)
+        finally:
+            self.add(stage_name, episode, seconds=time.perf_counter() - started, calls=1)
+            if token is not None:
+                current_episode.reset(token)
+
+    def as_dict(self):
+        with self.lock:
+            return {'stages': {stage_name: dict(counters) for stage_name, counters in self.stages.items()},
+                    'episodes': {episode: {stage_name: dict(counters) for stage_name, counters in stages.items()}
+                                 for episode, stages in self.episodes.items()}}
+
+    def write_json(self, path='pipeline_stats.json'):
+        write_file_atomically(path, json.dumps(self.as_dict(), ensure_ascii=False, indent=1))
+
+
+stats = PipelineStats()  # статистика всех этапов за время работы программы
+
+
+# Функция для обращения к серверу Stanford для обработки текста, а именно для определения частей речи и лемм слов и
+# парсинга зависимостей
+def annotate_text(text, wrapper=nlp_wrapper, properties=None):
+    with stats.stage('annotation') as record:
+        server_response = wrapper.annotate(text, properties=properties or ANNOTATION_PROPERTIES)
+        record(requests=1, bytes=len(text.encode('utf-8')) + len(server_response.encode('utf-8')))
+    return json.loads(server_response)  # получаем от сервера ответ в формате json
+
+
 # Функция для получения слов на перевод
 def get_words_to_be_translated(text, unwanted_words):
-    # обращаемся к серверу Stanford для обработки текста, а именно для определения частей речи и лемм слов и парсинга
-    # зависимостей
-    server_response = nlp_wrapper.annotate(text, properties={
-        'annotators': 'pos, lemma, depparse',
-        'outputFormat': 'JSON',
-        'timeout': 100000000000,
-    })
-    server_response = json.loads(server_response)  # получаем от сервера ответ в формате json
-    # создаем список частей речи, которые не нужны для словаря (предлоги, частицы, имена собственные и т. д.)
-    pos_deletion_list = ['PRP', 'DT', 'IN', 'TO', 'NNP', 'CC', 'CD', 'EX', 'JJR', 'JJS', 'LS', 'MD', 'PDT', 'RP',
-                         'PRP$', 'RBR', 'RBS', 'UH', 'WDT', 'WP', 'WP$', 'WRB', 'NNPS', 'POS', 'SYM']
-    words_list = []
+    sentences = annotate_text(text)["sentences"]
+    with stats.stage('word_extraction'):
+        return extract_words(sentences, unwanted_words)
+
+
+# Функция для получения слов на перевод из предложений, размеченных сервером Stanford. Все предложения обрабатываются
+# за один проход: фразовые глаголы берутся из индекса зависимостей compound:prt, а для исключения повторов вместо
+# списков используются словари (они сохраняют порядок добавления слов)
+def extract_words(sentences, unwanted_words):
+    unwanted_words = frozenset(unwanted_words)
+    candidates = {}  # слова и фразовые глаголы, уже прошедшие первичный отбор
+    checked_words = {}  # словарь вида {слово: попадает ли оно в итоговый список}
+
+    def add_word(word):
+        if word not in checked_words:
+            # среди полученных слов попадаются цифры либо слова, содержащие цифры, а также китайские символы,
+            # поэтому они сразу удаляются за ненадобностью
+            checked_words[word] = word not in unwanted_words and not DIGIT_PATTERN.search(word) and \
+                bool(LATIN_LETTER_PATTERN.search(word))
+
+    def add_candidate(word):
+        if word in candidates:
+            return
+        candidates[word] = None
+        if '-' not in word:
+            add_word(word)
+        elif STRETCHED_WORD_PATTERN.search(word):  # не берем в словарь слова, растягиваемые говорящим, типа
+            # he-e-e-e-e-e-e-elp или n-n-n-nothing
+            return
+        else:  # другие слова с дефисом берем как целиком, так и по частям
+            for word_part in word.replace('-', ' ').split():
+                if len(word_part) > 1:
+                    add_word(word_part)
+            if not word.startswith('un-'):  # избавляемся от слов с приставкой un-, т. к. основа слова будет
+                # переведена в любом случае
+                add_word(word)
+
     # обрабатываем результат в формате json
-    for sentence in server_response["sentences"]:
+    for sentence in sentences:
+        particles = {}  # индекс фразовых глаголов вида {глагол в тексте: [частицы]}
+        for dep in sentence["basicDependencies"]:
+            if dep['dep'] == "compound:prt":
+                particles.setdefault(dep["governorGloss"], []).append(dep["dependentGloss"])
         for word in sentence["tokens"]:
-            if word["pos"] not in pos_deletion_list and word["lemma"] not in unwanted_words and len(word["lemma"]) > 1 \
-                    and word["lemma"] not in words_list:
-                words_list.append(word["lemma"])
-            for dep in sentence["basicDependencies"]:  # извлекаем фразовые глаголы через парсинг зависимостей
-                if dep['dep'] == "compound:prt" and word["word"] == dep["governorGloss"]:
-                    dep["governorGloss"] = word["lemma"]
-                    phrasal_verb = dep["governorGloss"] + ' ' + dep["dependentGloss"]
-                    if phrasal_verb not in words_list:
-                        words_list.append(phrasal_verb)
-    unhyphenated_words_list = []
-    # перебираем слова из words_list для обработки слов, написанных через дефис
-    for word in words_list:
-        if '-' not in word:
-            unhyphenated_words_list.append(word)
+            if word["pos"] not in POS_DELETION_SET and len(word["lemma"]) > 1 and word["lemma"] not in unwanted_words:
+                add_candidate(word["lemma"])
+            if particles:  # фразовый глагол образуется от леммы первого совпавшего с глаголом слова
+                for particle in particles.pop(word["word"], ()):
+                    add_candidate(word["lemma"] + ' ' + particle)
+    return [word for word, is_wanted in checked_words.items() if is_wanted]
+
+
+# Функция для получения слов на перевод сразу для многих серий. Серии объединяются в пакеты по batch_size штук (один
+# запрос к серверу на пакет), пакеты обрабатываются одновременно на нескольких серверах CoreNLP (не больше
+# requests_per_endpoint запросов к каждому), а результаты возвращаются по мере готовности в виде пар (номер серии,
+# список слов). Результат по каждой серии сохраняется в checkpoint_dir, поэтому прерванный запуск можно продолжить:
+# уже обработанные серии повторно на сервер не отправляются. Если при обработке пакета возникла ошибка, результаты
+# остальных пакетов все равно сохраняются, а исключение возникает после них
+def annotate_episodes(episodes, unwanted_words, endpoints=('http://localhost:9000',), batch_size=4,
+                      requests_per_endpoint=2, checkpoint_dir='annotations'):
+    unwanted_words = frozenset(unwanted_words)
+    checkpoint_dir = get_checkpoint_dir(checkpoint_dir, unwanted_words)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    pending = []  # серии, которые еще не были обработаны
+    for key, text in dict(episodes).items():
+        checkpoint_path = os.path.join(checkpoint_dir, key + '.json')
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r', encoding='utf-8') as checkpoint_file:
+                words_list = json.load(checkpoint_file)
+            stats.add('annotation', key, cache_hits=1)
+            yield key, words_list
         else:
-            if re.search(r'\w-\w-', word):  # не берем в словарь слова, растягиваемые говорящим, типа
-                # he-e-e-e-e-e-e-elp или n-n-n-nothing
+            pending.append((key, text))
+    if not pending:
+        return
+    wrappers = queue.Queue()  # пул серверов: каждый сервер лежит в очереди requests_per_endpoint раз
+    for endpoint in endpoints:
+        for _ in range(requests_per_endpoint):
+            wrappers.put(StanfordCoreNLP(endpoint))
+    # пустая строка между сериями всегда считается концом предложения, поэтому предложения разных серий не сливаются
+    batch_properties = dict(ANNOTATION_PROPERTIES, **{'ssplit.newlineIsSentenceBreak': 'two'})
+
+    def annotate_batch(batch):
+        starts = []  # позиции начала каждой серии в объединенном тексте
+        position = 0
+        for _, text in batch:
+            starts.append(position)
+            position += len(text) + 2
+        joined_text = '\n\n'.join(text for _, text in batch)
+        wrapper = wrappers.get()
+        try:
+            server_response = annotate_text(joined_text, wrapper, batch_properties)
+        finally:
+            wrappers.put(wrapper)
+        batch_sentences = [[] for _ in batch]
+        for sentence in server_response["sentences"]:  # относим каждое предложение к серии по позиции его начала
+            if sentence["tokens"]:
+                index = bisect.bisect_right(starts, sentence["tokens"][0]["characterOffsetBegin"]) - 1
+                batch_sentences[index].append(sentence)
+        results = []
+        for (key, _), sentences in zip(batch, batch_sentences):
+            with stats.stage('word_extraction', key):
+                results.append((key, extract_words(sentences, unwanted_words)))
+        return results
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    batch_error = None  # первая ошибка при обработке пакета
+    with ThreadPoolExecutor(max_workers=len(endpoints) * requests_per_endpoint) as executor:
+        futures = [executor.submit(annotate_batch, batch) for batch in batches]
+        for future in as_completed(futures):
+            try:
+                batch_results = future.result()
+            except Exception as error:  # напр., сервер вернул вместо json страницу с ошибкой
+                batch_error = batch_error or error
                 continue
-            # другие слова с дефисом берем как целиком, так и по частям (если они не относятся к исключаемым словам)
+            for key, words_list in batch_results:
+                write_file_atomically(os.path.join(checkpoint_dir, key + '.json'),
+                                      json.dumps(words_list, ensure_ascii=False))
+                yield key, words_list
+    if batch_error is not None:
+        raise batch_error
+
+
+# Функция для получения папки, в которой annotate_episodes сохраняет результаты: для каждого списка unwanted_words
+# заводится отдельная подпапка checkpoint_dir, поэтому после изменения списка старые результаты не используются
+def get_checkpoint_dir(checkpoint_dir, unwanted_words):
+    return os.path.join(checkpoint_dir, get_hash(*sorted(set(unwanted_words)))[:16])
+
+
+# Класс для хранения уже полученных переводов на диске, чтобы при пересборке словарей к сериям в сеть уходил только
+# один запрос на каждую уникальную лемму, а не на каждую пару (серия, лемма)
+class TranslationCache:
+    def __init__(self, path='translation_cache.sqlite3', ttl=90 * 24 * 3600, negative_ttl=7 * 24 * 3600,
+                 max_entries=200000):
+        self.ttl = ttl  # срок жизни найденного перевода (в секундах)
+        self.negative_ttl = negative_ttl  # отдельный (более короткий) срок жизни записи "перевод не найден"
+        self.max_entries = max_entries  # максимальное число записей, после которого удаляются самые старые
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS translations (word TEXT PRIMARY KEY, backend TEXT, '
+                                'translation TEXT, created REAL NOT NULL)')  # translation = NULL - перевод не найден
+        self.connection.execute('CREATE INDEX IF NOT EXISTS translations_created ON translations (created)')
+        self.evict()
+
+    # Метод возвращает кортеж (найдено ли слово в кэше, словарь-источник, перевод или None)
+    def get(self, word):
+        row = self.connection.execute('SELECT backend, translation, created FROM translations WHERE word = ?',
+                                      (word,)).fetchone()
+        if row is None:
+            return False, None, None
+        backend, translation, created = row
+        ttl = self.ttl if translation is not None else self.negative_ttl
+        if time.time() - created > ttl:  # устаревшая запись считается отсутствующей
+            return False, None, None
+        return True, backend, translation
+
+    def put(self, word, backend, translation):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)',
+                                    (word, backend, translation, time.time()))
+
+    # Удаление устаревших записей, а затем самых старых записей сверх max_entries
+    def evict(self):
+        now = time.time()
+        with self.connection:
+            self.connection.execute('DELETE FROM translations WHERE (translation IS NOT NULL AND created < ?) OR '
+                                    '(translation IS NULL AND created < ?)', (now - self.ttl, now - self.negative_ttl))
+            self.connection.execute('DELETE FROM translations WHERE word IN (SELECT word FROM translations '
+                                    'ORDER BY created DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def close(self):
+        self.evict()
+        self.connection.close()
+
+
+# Класс для ограничения частоты запросов к одному сайту по схеме "ведро с токенами": в ведро поступает rate токенов
+# в секунду (но не больше capacity), а каждый запрос забирает один токен
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate  # сколько ждать до появления следующего токена
+            time.sleep(wait)
+
+
+# Класс для выполнения запросов: на каждый сайт заводится одна сессия с пулом соединений (чтобы не устанавливать
+# TCP/TLS-соединение заново для каждого слова), ограничение числа одновременных запросов и частоты запросов, а также
+# повтор запроса с растущей паузой при сетевых ошибках и ответах 429/5xx (если и последняя попытка закончилась таким
+# ответом, возникает исключение rq.HTTPError, как и при сетевой ошибке)
+class PooledFetcher:
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_per_host=4, rate_per_host=5.0, retries=3, backoff=0.5, timeout=30):
+        self.max_per_host = max_per_host
+        self.rate_per_host = rate_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.hosts = {}  # словарь вида {сайт: (сессия, семафор, ведро с токенами)}
+        self.lock = threading.Lock()
+
+    def _host(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.hosts:
+                session = rq.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_per_host)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.hosts[host] = (session, threading.BoundedSemaphore(self.max_per_host),
+                                    TokenBucket(self.rate_per_host))
+            return self.hosts[host]
+
+    def get(self, url, headers=None):
+        session, semaphore, bucket = self._host(url)
+        with semaphore:
+            for attempt in range(self.retries + 1):
+                bucket.acquire()
+                delay = self.backoff * 2 ** attempt
+                try:
+                    response = session.get(url, headers=headers, timeout=self.timeout)
+                except (rq.ConnectionError, rq.Timeout):
+                    if attempt == self.retries:
+                        raise
+                else:
+                    if response.status_code not in self.retry_statuses:
+                        return response
+                    if attempt == self.retries:
+                        response.raise_for_status()
+                    retry_after = response.headers.get('Retry-After', '')
+                    if retry_after.isdigit():  # сервер сам указал, через сколько секунд повторить запрос (обычно
+                        # вместе с ответом 429)
+                        delay = max(delay, int(retry_after))
+                stats.add('html_fetch', retries=1)
+                time.sleep(delay)
+
+    def close(self):
+        for session, _, _ in self.hosts.values():
+            session.close()
+        self.hosts.clear()
+
+
+WOOORDHUNT_URL = 'https://wooordhunt.ru/word/'  # ссылка на страницу со словарем En-Ru
+MULTITRAN_URL = 'https://www.multitran.com/m.exe?l1=1&l2=2&s='  # ссылка на страницу с другим словарем En-Ru
+# строка частотного словаря: частота, слово (или фразовый глагол) и перевод, который начинается с форм глагола,
+# транскрипции или тире
+FREQUENCY_LINE_PATTERN = re.compile(r'^\d+ +(.+?)((?: \(| \|| \[| [-–] ).*)$')
+
+
+# Функция для проверки ответа сайта-словаря: ответ 429 или 5xx - это сетевая ошибка, а не "слово не найдено", поэтому
+# при нем возникает исключение rq.HTTPError, а при ответе 404 или 410 (страницы слова нет) возвращается False
+def is_word_page(response):
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+    return response.status_code not in (404, 410)
+
+
+# Функция для извлечения перевода слова с сайта wooordhunt (если перевод не найден, возникает исключение). Через get
+# можно передать функцию для запросов, например, PooledFetcher.get
+def translate_with_wooordhunt(word_to_translate, get=rq.get):
+    word_url = WOOORDHUNT_URL + word_to_translate  # формируем url страницы с переводом из двух частей
+    with stats.stage('html_fetch') as record:
+        response = get(word_url)  # сохраняем ответ сервера на запрос к странице с текстом
+        record(requests=1, bytes=len(response.content))
+    if not is_word_page(response):
+        return None
+    with stats.stage('html_parsing'):
+        response.encoding = 'utf-8'
+        response_html = response.text  # сохраняем исходный код страницы из ответа сервера
+        response_soup = BeautifulSoup(response_html, 'html.parser')  # делаем из него суп
+    transcription_div = response_soup.find('div', class_='trans_sound')  # находим нужный div
+    transcription_span = transcription_div.find('span')  # затем в нем - транскрипцию слова
+    translation = response_soup.find('div', class_='t_inline_en')  # затем перевод
+    word_forms = response_soup.find('div', id='word_forms')  # проверяем, имеются ли у слова, в частности, глагола,
+    # другие формы
+    if word_forms:
+        forms = re.findall(r'(?<=</span> )\S*(?=\s*<)', str(word_forms))
+        if len(forms) > 1:  # если они есть, то нужных форм должно быть две (а не одна, как, напр., woman у women)
+            irreg_forms = '(' + ', '.join(forms) + ')'  # записываем формы вместе с переводом слова
+            return ' ' + irreg_forms + transcription_span.text + ' – ' + translation.text
+    return transcription_span.text + ' – ' + translation.text  # а если двух форм нет, записываем перевод без них
+
+
+# Функция для извлечения перевода слова с сайта multitran (если перевод не найден, возвращается None)
+def translate_with_multitran(word_to_translate, get=rq.get):
+    word_to_find = re.sub(r' ', '+', re.sub(r'’', '%27', word_to_translate))  # слово/выражение приводится
+    # в нужный для добавления к ссылке вид
+    word_url = MULTITRAN_URL + word_to_find  # формируем url страницы из двух частей
+    with stats.stage('html_fetch') as record:
+        response = get(word_url)  # сохраняем ответ сервера на запрос к странице с текстом
+        record(requests=1, bytes=len(response.content))
+    if not is_word_page(response):
+        return None
+    with stats.stage('html_parsing'):
+        response.encoding = 'utf-8'
+        response_html = response.text  # сохраняем исходный код страницы из ответа сервера
+        response_soup = BeautifulSoup(response_html, 'html.parser')  # делаем из него суп
+    transcription_div = (response_soup.find_all('div', class_='middle_col')[2])  # находим нужный div
+    transcription_tr = (transcription_div.find_all('tr')[1])  # находим tr с транскрипцией
+    transcription_span = transcription_tr.find('span')  # находим span с транскрипцией
+    transcription_a = transcription_tr.find('a')  # находим a, где записано переводимое слово
+    transcription_a_text = transcription_a.text.lower()  # приводим запись к нижнему регистру, чтобы она
+    # совпадала с искомым словом
+    if transcription_a_text != word_to_translate:  # если перевод слова находится только частично, напр.,
+        # только semi- в слове semi-rational, то его перевод не принимается
+        return None
+    if transcription_span:  # если транскрипция нашлась, то она записывается в переменную
+        transcription_span_text = ' ' + re.sub(r"\'", "ˈ", transcription_span.text)  # заменяем апостроф,
+        # служащий ударением в транскрипции в "Мультитране", на другой знак, который не будет мешать
+        # считыванию словаря в дальнейшем
+    else:
+        transcription_span_text = ''
+    translation_output = []  # создается список, в который будут добавляться варианты перевода слова
+    translation_div = (response_soup.find_all('div', class_='middle_col')[2])
+    translation_tr = (translation_div.find_all('tr')[2])
+    translation_td = (translation_tr.find_all('td')[1])
+    for a in translation_td.find_all('a', recursive=False, limit=4):  # набираем 4 варианта перевода
+        if re.findall(r"[А-Яа-я]", a.text):  # проверяем, есть ли перевод на русский язык, а не ссылка на
+            # другую форму слова на английском языке (напр., head up = heads-up), и если есть, то записываем
+            # этот перевод, а если нет, то идем дальше
+            translation_output.append(a.text)
+    if not translation_output:
+        return None
+    return transcription_span_text + ' - ' + '; '.join(translation_output)  # записываем варианты перевода
+
+
+# Классы словарей-источников перевода: метод lookup возвращает перевод слова или None, если слово не нашлось
+# (при сетевых ошибках возникает исключение rq.RequestException)
+class TranslationBackend(ABC):
+    name = None  # название словаря, которое записывается в кэш вместе с переводом
+
+    @abstractmethod
+    def lookup(self, word_to_translate):
+        pass
+
+
+# Перевод с сайта: функция translate получает слово и функцию для запросов get
+class WebsiteBackend(TranslationBackend):
+    translate = None  # в подклассах - staticmethod(функция перевода)
+
+    def __init__(self, get=rq.get):
+        self.get = get
+
+    def lookup(self, word_to_translate):
+        try:
+            return self.translate(word_to_translate, self.get)
+        except rq.RequestException:
+            raise
+        except Exception:  # на странице нет нужных элементов, т. е. слово не нашлось
+            return None
+
+
+class WooordhuntBackend(WebsiteBackend):
+    name = 'wooordhunt'
+    translate = staticmethod(translate_with_wooordhunt)
+
+
+class MultitranBackend(WebsiteBackend):
+    name = 'multitran'
+    translate = staticmethod(translate_with_multitran)
+
+
+# Класс для перевода слов без обращения к сайтам: по файлу, созданному функцией build_offline_dictionary. Файл
+# отображается в память (mmap) и не считывается целиком, а слово ищется в нем двоичным поиском по строкам
+class OfflineDictionaryBackend(TranslationBackend):
+    name = 'offline'
+
+    def __init__(self, path='offline_dictionary.tsv'):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b''
+
+    # Конец строки, которая начинается с позиции line_start (последняя строка файла может быть без перевода строки)
+    def _line_end(self, line_start):
+        line_end = self.data.find(b'\n', line_start)
+        return line_end if line_end != -1 else len(self.data)
+
+    def lookup(self, word_to_translate):
+        word_bytes = word_to_translate.encode('utf-8')
+        low, high = 0, len(self.data)  # границы поиска всегда совпадают с началом строки
+        while low < high:  # ищем первую строку, слово в которой не меньше искомого
+            line_start = self.data.rfind(b'\n', 0, (low + high) // 2) + 1
+            line_end = self._line_end(line_start)
+            if self.data[line_start:line_end].partition(b'\t')[0] < word_bytes:
+                low = line_end + 1
             else:
-                split_list = (re.sub(r'-', ' ', word)).split()
-                word_parts_list = []
-                [word_parts_list.append(word_part) for word_part in split_list if word_part not in word_parts_list and
-                 word_part not in unhyphenated_words_list and len(word_part) > 1]
-                unhyphenated_words_list.extend(word_parts_list)
-                if not word.startswith('un-'):  # избавляемся от слов с приставкой un-, т. к. основа слова будет \
-                    # переведена в любом случае
-                    unhyphenated_words_list.append(word)
-    final_list = []
-    for word in unhyphenated_words_list:
-        if word in unwanted_words or re.search(r'\d+', word) or not re.search(r'[a-zA-Z]', word):  # среди полученных \
-            # слов попадаются цифры либо слова, содержащие цифры, а также китайские символы, поэтому они сразу удаляются
-            # за ненадобностью
+                high = line_start
+        word, _, translation = self.data[low:self._line_end(low)].partition(b'\t')
+        if low < len(self.data) and word == word_bytes:
+            return translation.decode('utf-8')
+        return None
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+
+# Функция для создания файла для OfflineDictionaryBackend из частотного словаря (frequency_dictionary.txt): в файл
+# записываются строки вида "слово<TAB>перевод", отсортированные по слову. Возвращает число слов
+def build_offline_dictionary(source_path='frequency_dictionary.txt', output_path='offline_dictionary.tsv'):
+    entries = {}
+    with open(source_path, 'r', encoding='utf-8') as source_file:
+        for line in source_file:
+            match = FREQUENCY_LINE_PATTERN.match(line.rstrip('\n'))
+            if match:
+                entries.setdefault(match.group(1), match.group(2).replace('\t', ' '))
+    lines = [word.encode('utf-8') + b'\t' + entries[word].encode('utf-8') + b'\n'
+             for word in sorted(entries, key=lambda word: word.encode('utf-8'))]
+    temporary_path = output_path + '.tmp'
+    with open(temporary_path, 'wb') as output_file:
+        output_file.write(b''.join(lines))
+    os.replace(temporary_path, output_path)
+    return len(lines)
+
+
+# Функция для получения словарей-источников, которые используются по умолчанию: сначала wooordhunt, затем multitran
+def get_network_backends(get=rq.get):
+    return [WooordhuntBackend(get), MultitranBackend(get)]
+
+
+# Функция для поиска перевода слова по очереди во всех словарях-источниках. Возвращает кортеж (название словаря,
+# перевод или None, окончательный ли результат). Результат не окончательный, если перевод найден, но один из
+# предыдущих словарей был недоступен: такой перевод можно использовать, но не записывать в кэш, иначе на весь срок
+# хранения в кэше он заменит перевод из более приоритетного словаря. Если слово не нашлось, а один из словарей был
+# недоступен, то сетевая ошибка пробрасывается дальше, чтобы "не найдено" не попадало в кэш из-за нее
+def lookup_translation(word_to_translate, backends):
+    network_error = None
+    for backend in backends:
+        try:
+            translation_result = backend.lookup(word_to_translate)
+        except rq.RequestException as error:
+            network_error = error
             continue
-        else:
-            final_list.append(word)
-    words_list = final_list
-    return words_list
+        if translation_result is not None:
+            return backend.name, translation_result, network_error is None
+    if network_error is not None:
+        raise network_error
+    return None, None, True
 
 
-# Функция для извлечения перевода слов
-def get_translations(words_list):
+# Функция для извлечения перевода слов. Если передан кэш, то в сеть уходят запросы только для слов, которых в нем нет.
+# По умолчанию слова ищутся на wooordhunt, а затем на multitran, но можно передать и другие словари-источники backends
+def get_translations(words_list, cache=None, backends=None):
+    if backends is None:
+        backends = get_network_backends()
     translated_dict = {}  # результатом выполнения функции является словарь вида {слово: перевод слова}
     for word_to_translate in words_list:  # итерируемся по всем словам из списка
-        try:
-            main_url = 'https://wooordhunt.ru/word/'  # сохраняем в переменную ссылку на страницу со словарем En-Ru
-            word_url = main_url + word_to_translate  # формируем url страницы с переводом из двух частей
-            response = rq.get(word_url)  # сохраняем ответ сервера на запрос к странице с текстом
-            response.encoding = 'utf-8'
-            response_html = response.text  # сохраняем исходный код страницы из ответа сервера
-            response_soup = BeautifulSoup(response_html, 'html.parser')  # делаем из него суп
-            transcription_div = response_soup.find('div', class_='trans_sound')  # находим нужный div
-            transcription_span = transcription_div.find('span')  # затем в нем - транскрипцию слова
-            translation = response_soup.find('div', class_='t_inline_en')  # затем перевод
-            if response_soup.find('div', id='word_forms'):  # проверяем, имеются ли у слова, в частности, глагола,
-                # другие формы
-                word_forms = response_soup.find('div', id='word_forms')
-                forms = re.findall(r'(?<=</span> )\S*(?=\s*<)', str(word_forms))
-                if len(forms) > 1:  # если они есть, то нужных форм должно быть две (а не одна, как, напр., woman у
-                    # women)
-                    irreg_forms = '(' + ', '.join(forms) + ')'  # записываем формы вместе с переводом слова в словарь
-                    translation_result = ' ' + irreg_forms + transcription_span.text + ' – ' + translation.text
+        if cache is not None:
+            found, backend, translation_result = cache.get(word_to_translate)
+            stats.add('translation_cache', requests=1, cache_hits=int(found))
+            if found:
+                if translation_result is not None:
                     translated_dict[word_to_translate] = translation_result
-                else:
-                    translation_result = transcription_span.text + ' – ' + translation.text  # а если двух форм нет,
-                    translated_dict[word_to_translate] = translation_result  # записываем перевод без них
+                continue
+        try:
+            backend, translation_result, is_final = lookup_translation(word_to_translate, backends)
+        except rq.RequestException:  # при сетевой ошибке пропускаем слово, не запоминая результат
+            continue
+        if cache is not None and is_final:
+            cache.put(word_to_translate, backend, translation_result)
+        if translation_result is not None:
+            translated_dict[word_to_translate] = translation_result
+    return translated_dict
+
+
+# Функция для параллельного извлечения перевода слов: слова, которых нет в кэше, переводятся одновременно в max_workers
+# потоках через общий PooledFetcher, при этом для каждого слова сохраняется порядок словарей-источников backends
+# (по умолчанию "сначала wooordhunt, затем multitran"). Кэш читается и пополняется только в вызывающем потоке. Если
+# передан список failed_words, в него добавляются слова, которые не удалось перевести из-за сетевых ошибок, а также
+# слова, перевод которых взят из запасного словаря, потому что предыдущий был недоступен (такой перевод возвращается,
+# но в кэш не записывается)
+def fetch_translations(words_list, cache=None, fetcher=None, max_workers=8, backends=None, failed_words=None):
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = PooledFetcher()
+    if backends is None:
+        backends = get_network_backends(fetcher.get)
+    results = {}  # словарь вида {слово: перевод или None}
+    words_to_fetch = []
+    for word_to_translate in dict.fromkeys(words_list):  # убираем повторы, сохраняя порядок слов
+        if cache is not None:
+            found, backend, translation_result = cache.get(word_to_translate)
+            stats.add('translation_cache', requests=1, cache_hits=int(found))
+            if found:
+                results[word_to_translate] = translation_result
+                continue
+        words_to_fetch.append(word_to_translate)
+
+    context = contextvars.copy_context()  # чтобы статистика запросов из потоков относилась к текущей серии
+
+    def fetch_one(word_to_translate):
+        try:
+            return context.copy().run(lookup_translation, word_to_translate, backends)
+        except rq.RequestException:
+            return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for word_to_translate, lookup_result in zip(words_to_fetch, executor.map(fetch_one, words_to_fetch)):
+                if lookup_result is None:  # при сетевой ошибке пропускаем слово, не запоминая результат
+                    if failed_words is not None:
+                        failed_words.append(word_to_translate)
+                    continue
+                backend, translation_result, is_final = lookup_result
+                if not is_final:
+                    if failed_words is not None:
+                        failed_words.append(word_to_translate)
+                elif cache is not None:
+                    cache.put(word_to_translate, backend, translation_result)
+                results[word_to_translate] = translation_result
+    finally:
+        if own_fetcher:
+            fetcher.close()
+    return {word: results[word] for word in words_list if results.get(word) is not None}
+
+
+# Регулярные выражения для очистки текстов серий от слов и фраз, которые не произносятся героями
+SERIES_EPISODE_PATTERN = re.compile(r'Series (\d{2}) Episode (\d{2}) – ')
+# строки без двоеточия (т. е. без указания говорящего), а также описания места действия и авторов
+NON_SPEECH_LINE_PATTERN = re.compile(r'^(?:[^:\n]*\n|(?:Scene:|Teleplay:|Story:|Written by) .*)', re.MULTILINE)
+SPEAKER_PATTERN = re.compile(r'^[\w\W]*?: ', re.MULTILINE)  # указание говорящего
+REMARK_PATTERN = re.compile(r'\([\w\W]*?\)[,: ]*')  # ремарки в скобках
+SPACES_OR_PERCENT_PATTERN = re.compile(r'\s\s|%')  # json "спотыкается" о символ %, поэтому он заменяется словом
+ELLIPSIS_PATTERN = re.compile(r'\.\s\.\.')
+SPACE_DOT_PATTERN = re.compile(r'\s\.')
+DOUBLE_SPACE_PATTERN = re.compile(r'\s\s')
+
+
+# Функция для построчного чтения файла с текстами серий: возвращает по одной паре (номер сезона + номер серии, напр.,
+# 0101, текст серии), поэтому в памяти одновременно находится текст только одной серии. Текст серии начинается после
+# строки с ее названием и заканчивается перед первой пустой строкой
+def iter_raw_episodes(path):
+    with open(path, 'r', encoding='utf-8') as corpus:
+        key = None
+        lines = []
+        for line in corpus:
+            if key is None:
+                match = SERIES_EPISODE_PATTERN.search(line)
+                if match:
+                    key = match.group(1) + match.group(2)
+                    lines = []
+            elif line == '\n':
+                yield key, ''.join(lines)[:-1]
+                key = None
             else:
-                translation_result = transcription_span.text + ' – ' + translation.text
-                translated_dict[word_to_translate] = translation_result
-        except Exception:
+                lines.append(line)
+
+
+# Функция для очистки текста серии от лишних слов, фраз, которые не произносятся героями (напр., описание места
+# действия или указание говорящего), ненужных элементов и пробелов. Замены, которые не влияют друг на друга,
+# выполняются за один проход по тексту
+def clean_episode_text(text):
+    with stats.stage('preprocessing') as record:
+        record(bytes=len(text.encode('utf-8')))
+        text = NON_SPEECH_LINE_PATTERN.sub('', text)
+        text = SPEAKER_PATTERN.sub('', text)
+        text = REMARK_PATTERN.sub('', text)
+        text = SPACES_OR_PERCENT_PATTERN.sub(lambda match: ' percent' if match.group() == '%' else ' ', text)
+        text = ELLIPSIS_PATTERN.sub('…', text)
+        # пробел с точкой после знака препинания удаляется, а в остальных случаях удаляется только пробел
+        text = SPACE_DOT_PATTERN.sub(lambda match: '' if match.start() and text[match.start() - 1] in '.!,?…' else '.',
+                                     text)
+        text = text.replace('\xa0', '').replace('\n', ' ')  # удаляем лишние случайные символы и переносы строк
+        return DOUBLE_SPACE_PATTERN.sub(' ', text)
+
+
+# Функция для очистки текстов всех серий: серии по одной считываются из source_path и записываются в output_path
+# в формате JSON Lines (одна строка вида {"episode": "0101", "text": "..."} на серию). Возвращает число серий
+def preprocess_transcripts(source_path='preprocessed_transcripts.txt', output_path='transcripts.jsonl'):
+    return write_transcripts(((key, clean_episode_text(text)) for key, text in iter_raw_episodes(source_path)),
+                             output_path)
+
+
+# Функция для записи пар (номер серии, текст серии) в файл формата JSON Lines целиком (через временный файл).
+# Возвращает число серий
+def write_transcripts(episodes, path='transcripts.jsonl'):
+    episodes_count = 0
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as output_file:
+        for key, text in episodes:
+            output_file.write(json.dumps({'episode': key, 'text': text}, ensure_ascii=False))
+            output_file.write('\n')
+            episodes_count += 1
+    os.replace(temporary_path, path)
+    return episodes_count
+
+
+# Функция для построчного чтения очищенных текстов серий: возвращает пары (номер серии, текст серии)
+def iter_transcripts(path='transcripts.jsonl'):
+    with open(path, 'r', encoding='utf-8') as transcripts_file:
+        for line in transcripts_file:
+            episode = json.loads(line)
+            yield episode['episode'], episode['text']
+
+
+# Функция для разбора файла translations_dict.txt, в который посерийные словари записывались в виде str(dict)
+def parse_translations_dict(read_string):
+    numbers_list = re.findall(r'(?<=\')\d{4}(?=\': {)', read_string)  # находим все номера серий
+    translations_list = re.findall(r'(?<=\'\d{4}\': {)[\w\W]*?(?=})', read_string)  # находим все строки со словарями
+    keys = [re.findall(r'(?<=\')[^:\s,][\w\W]*?(?=\':)', translation) for translation in translations_list]  # находим
+    # в найденных строках все слова для каждой серии
+    values = [re.findall(r'(?<=\': \')\s[\w\W]*?(?=\')', translation) for translation in translations_list]  # находим
+    # в найденных строках все переводы этих слов
+    tr_dicts = [dict(zip(keys[i], values[i])) for i in range(len(keys))]  # создаем словари для всех серий
+    return dict(zip(numbers_list, tr_dicts))  # создаем словарь вида {номер серии: словарь к серии}
+
+
+# Класс для хранения посерийных словарей в базе SQLite с индексами по номеру серии и по лемме: словарь к одной серии
+# считывается из базы только при обращении к нему, а не вместе со всеми остальными
+class VocabularyStore:
+    def __init__(self, path='vocabulary.sqlite3'):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS episodes (code TEXT PRIMARY KEY)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS vocabulary (episode TEXT NOT NULL, position INTEGER NOT '
+                                'NULL, lemma TEXT NOT NULL, translation TEXT NOT NULL, PRIMARY KEY (episode, '
+                                'position)) WITHOUT ROWID')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS vocabulary_lemma ON vocabulary (lemma)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS learned_words (word TEXT PRIMARY KEY)')
+        self.loaded = {}  # уже считанные из базы словари вида {номер серии: словарь к серии}
+
+    def episodes(self):
+        return [code for code, in self.connection.execute('SELECT code FROM episodes ORDER BY code')]
+
+    # Словарь к серии вида {слово: перевод слова} (KeyError, если такой серии нет)
+    def episode(self, code):
+        if code not in self.loaded:
+            if self.connection.execute('SELECT 1 FROM episodes WHERE code = ?', (code,)).fetchone() is None:
+                raise KeyError(code)
+            with stats.stage('vocabulary_loading', code) as record:
+                self.loaded[code] = dict(self.connection.execute(
+                    'SELECT lemma, translation FROM vocabulary WHERE episode = ? ORDER BY position', (code,)))
+                record(requests=1)
+        return self.loaded[code]
+
+    # Пары (номер серии, словарь к серии) для всех серий по порядку
+    def items(self):
+        for code in self.episodes():
+            yield code, self.episode(code)
+
+    # Список пар (номер серии, перевод) для всех серий, в словарях к которым есть это слово
+    def lookup(self, lemma):
+        return self.connection.execute('SELECT episode, translation FROM vocabulary WHERE lemma = ? ORDER BY episode',
+                                       (lemma,)).fetchall()
+
+    # Запись (или перезапись) словаря к серии
+    def put_episode(self, code, vocabulary, commit=True):
+        self.connection.execute('DELETE FROM vocabulary WHERE episode = ?', (code,))
+        self.connection.execute('INSERT OR IGNORE INTO episodes VALUES (?)', (code,))
+        self.connection.executemany('INSERT INTO vocabulary VALUES (?, ?, ?, ?)',
+                                    [(code, position, lemma, translation) for position, (lemma, translation) in
+                                     enumerate(vocabulary.items())])
+        self.loaded[code] = dict(vocabulary)
+        if commit:
+            self.connection.commit()
+
+    def delete_episode(self, code):
+        with self.connection:
+            self.connection.execute('DELETE FROM vocabulary WHERE episode = ?', (code,))
+            self.connection.execute('DELETE FROM episodes WHERE code = ?', (code,))
+        self.loaded.pop(code, None)
+
+    # Множество слов, добавленных пользователем в изученные
+    def learned_words(self):
+        return {word for word, in self.connection.execute('SELECT word FROM learned_words')}
+
+    def add_learned_words(self, words):
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO learned_words VALUES (?)', [(word,) for word in words])
+
+    # Перенос в базу посерийных словарей из файла translations_dict.txt
+    def import_translations_dict(self, path):
+        with stats.stage('translations_dict_loading') as record:
+            with open(path, 'r', encoding='utf-8') as string_to_read:
+                read_string = string_to_read.read()
+            translations_dict = parse_translations_dict(read_string)
+            record(bytes=len(read_string.encode('utf-8')))
+        with self.connection:
+            for code, vocabulary in translations_dict.items():
+                self.put_episode(code, vocabulary, commit=False)
+        return len(translations_dict)
+
+    def close(self):
+        self.connection.close()
+
+
+# Класс для многократных запросов к словарям в одном запуске программы: словари ко всем сериям один раз загружаются
+# в память вместе с индексом {слово: серии, в словарях к которым оно есть}. Для каждой серии хранится словарь без
+# изученных слов, и при добавлении слова в изученные оно удаляется только из словарей тех серий, где оно встречается
+class VocabularyIndex:
+    def __init__(self, vocabulary_store):
+        self.vocabulary_store = vocabulary_store
+        self.vocabularies = dict(vocabulary_store.items())  # словарь вида {номер серии: словарь к серии}
+        self.word_episodes = {}  # словарь вида {слово: [номера серий]}
+        for code, vocabulary in self.vocabularies.items():
+            for word in vocabulary:
+                self.word_episodes.setdefault(word, []).append(code)
+        self.learned_words = vocabulary_store.learned_words()
+        self.words_to_learn = {}  # словарь вида {номер серии: словарь к серии без изученных слов}
+
+    # Словарь к серии без изученных слов (KeyError, если такой серии нет)
+    def episode(self, code):
+        if code not in self.words_to_learn:
+            self.words_to_learn[code] = {word: translation for word, translation in self.vocabularies[code].items()
+                                         if word not in self.learned_words}
+        return self.words_to_learn[code]
+
+    # Список пар (номер серии, перевод) для всех серий, в словарях к которым есть это слово
+    def lookup(self, word):
+        return [(code, self.vocabularies[code][word]) for code in self.word_episodes.get(word, ())]
+
+    # Добавление слов в изученные (они сохраняются в хранилище). Возвращает список слов, которых еще не было в изученных
+    def learn(self, words):
+        new_words = [word for word in dict.fromkeys(words) if word not in self.learned_words]
+        self.vocabulary_store.add_learned_words(new_words)
+        self.learned_words.update(new_words)
+        for word in new_words:
+            for code in self.word_episodes.get(word, ()):
+                if code in self.words_to_learn:
+                    self.words_to_learn[code].pop(word, None)
+        return new_words
+
+
+# Функция для работы со словарями в режиме диалога: программа не завершается после вывода одного словаря, а ждет
+# следующих запросов, пока пользователь не введет пустую строку
+def run_repl(vocabulary_store):
+    vocabulary_index = VocabularyIndex(vocabulary_store)
+    print('\nВведи сезон и серию без пробела (например, 0907), чтобы посмотреть словарь к серии без изученных слов;\n'
+          '? слово - чтобы найти перевод слова и серии, где оно встречается;\n'
+          '+ слова - чтобы добавить слова в изученные (через пробел или, для фразовых глаголов, через запятую);\n'
+          'пустая строка - выход.')
+    while True:
+        try:
+            query = input('\n> ').strip()
+        except EOFError:
+            break
+        if not query:
+            break
+        if query.startswith('+'):
+            words = query[1:].split(',') if ',' in query else query[1:].split()
+            new_words = vocabulary_index.learn(word.strip() for word in words if word.strip())
+            print('Добавлено в изученные:', ', '.join(new_words) if new_words else 'ничего нового')
+        elif query.startswith('?'):
+            word = query[1:].strip()
+            found = vocabulary_index.lookup(word)
+            if not found:
+                print('Слово не найдено')
+            for code, translation in found[:1]:
+                print(word, translation, sep='')
+            if found:
+                print('Серии:', ', '.join(code for code, _ in found))
+        else:
             try:
-                main_url = 'https://www.multitran.com/m.exe?l1=1&l2=2&s='  # сохраняем в переменную ссылку на страницу с
-                # другим словарем En-Ru
-                word_to_find = re.sub(r' ', '+', re.sub(r'’', '%27', word_to_translate))  # слово/выражение приводится
-                # в нужный для добавления к ссылке вид
-                word_url = main_url + word_to_find  # формируем url страницы из двух частей
-                response = rq.get(word_url)  # сохраняем ответ сервера на запрос к странице с текстом
-                response.encoding = 'utf-8'
-                response_html = response.text  # сохраняем исходный код страницы из ответа сервера
-                response_soup = BeautifulSoup(response_html, 'html.parser')  # делаем из него суп
-                transcription_div = (response_soup.find_all('div', class_='middle_col')[2])  # находим нужный div
-                transcription_tr = (transcription_div.find_all('tr')[1])  # находим tr с транскрипцией
-                transcription_span = transcription_tr.find('span')  # находим span с транскрипцией
-                transcription_a = transcription_tr.find('a')  # находим a, где записано переводимое слово
-                transcription_a_text = transcription_a.text.lower()  # приводим запись к нижнему регистру, чтобы она
-                # совпадала с искомым словом
-                if transcription_a_text != word_to_translate:  # если перевод слова находится только частично, напр.,
-                    # только semi- в слове semi-rational, то его перевод не принимается
-                    continue
-                if transcription_span:  # если транскрипция нашлась, то она записывается в переменную
-                    transcription_span_text = ' ' + re.sub(r"\'", "ˈ", transcription_span.text)  # заменяем апостроф,
-                    # служащий ударением в транскрипции в "Мультитране", на другой знак, который не будет мешать
-                    # считыванию словаря в дальнейшем
-                else:
-                    transcription_span_text = ''
-                translation_output = []  # создается список, в который будут добавляться варианты перевода слова
-                translation_div = (response_soup.find_all('div', class_='middle_col')[2])
-                translation_tr = (translation_div.find_all('tr')[2])
-                translation_td = (translation_tr.find_all('td')[1])
-                for a in translation_td.find_all('a', recursive=False, limit=4):  # набираем 4 варианта перевода
-                    if re.findall(r"[А-Яа-я]", a.text):  # проверяем, есть ли перевод на русский язык, а не ссылка на
-                        # другую форму слова на английском языке (напр., head up = heads-up), и если есть, то записываем
-                        # этот перевод, а если нет, то идем дальше
-                        translation_output.append(a.text)
-                        translation_result = transcription_span_text + ' - ' + '; '.join(translation_output)
-                        # записываем варианты перевода
-                        translated_dict[word_to_translate] = translation_result
-                    else:
-                        continue
-            except Exception:  # если совсем ничего не нашлось на обоих сайтах, пропускаем слово
+                episode_vocabulary = vocabulary_index.episode(query)
+            except KeyError:
+                print('Такой серии нет')
                 continue
-    return translated_dict
+            for key in episode_vocabulary.keys():
+                print(key, episode_vocabulary[key], sep='')
 
 
-# text_dict = {}  # создаем пустой словарь
-# url = 'https://bigbangtrans.wordpress.com/'  # сохраняем в переменную ссылку на страницу
-# url_response = rq.get(url)  # с помощью requests получаем ответ сервера страницы и клдаем в переменную r
-# html = url_response.text  # достаем из ответа сервера исходный код страниц и кладем в переменную html
-# soup = BeautifulSoup(html, 'html.parser')  # передаем исходный код BeautifulSoup
-# for tag in soup.find_all('a'):  # итерируемся по всем тэгам a, чтобы найти тексты серий
-#     if 'episode' not in tag['href']:  # проверяем, есть ли в ссылках внутри этих тэгов строка episode
-#         continue
-#     episode_name = tag.text  # сохраняем название серии
-#     child_url = f'{tag["href"]}'  # формируем url страницы с текстов из двух частей
-#     child_url_response = rq.get(child_url)  # сохраняем ответ сервера на запрос к странице с текстом
-#     child_html = child_url_response.text  # сохраняем исходный код страницы из ответа сервера
-#     child_soup = BeautifulSoup(child_html, 'html.parser')  # делаем из него суп
-#     episode_text = []
-#     for child_tag in child_soup.find_all('div', class_='entrytext'):  # находим и добавляем в список тексты серий
-#         for content in child_tag.find_all('p'):
-#             episode_text.append(content.text.strip().replace('\n\n', '\n'))
-#     episode_text = '\n'.join(episode_text)
-#     text_dict[episode_name] = episode_text  # добавляем в словарь текст серии в качестве ключа
-#     with open("transcripts.txt", 'a', encoding='utf-8') as transcripts_file:  # записываем словарь в файл
-#         transcripts_file.write(episode_name + '\n\n')
-#         transcripts_file.write(episode_text + '\n\n\n')
+# Класс для подсчета частоты слов в словарях к сериям. Для каждой серии и для каждого сезона заранее сохраняются
+# частоты слов (Counter), поэтому частоты по нескольким сезонам или сериям получаются сложением уже посчитанных
+# частот, а не повторным подсчетом по всем словарям
+class FrequencyIndex:
+    def __init__(self, episodes):  # episodes - пары (номер серии, словарь к серии)
+        self.episode_counts = {}  # словарь вида {номер серии: частоты слов в словаре к серии}
+        self.season_counts = {}  # словарь вида {номер сезона: частоты слов в словарях к сериям сезона}
+        self.totals = Counter()  # частоты слов по всему сериалу
+        self.translations = {}  # перевод каждого слова берется из первой серии, где оно встретилось
+        for code, vocabulary in episodes:
+            counts = Counter(vocabulary.keys())
+            self.episode_counts[code] = counts
+            self.season_counts.setdefault(int(code[:2]), Counter()).update(counts)
+            self.totals.update(counts)
+            for word, translation in vocabulary.items():
+                self.translations.setdefault(word, translation)
+
+    # Частоты слов по всему сериалу, по сезонам seasons (напр., range(3, 6)) или по сериям episodes (напр.,
+    # ['0101', '0102']). Возвращается новый Counter, поэтому его изменение не влияет на сам индекс
+    def counts(self, seasons=None, episodes=None):
+        if seasons is None and episodes is None:
+            return Counter(self.totals)
+        if seasons is not None:  # seasons может быть генератором (а он перебирается дважды) и может содержать номера
+            # сезонов строками, как в номерах серий (напр., '03')
+            seasons = {int(season) for season in seasons}
+        counts = Counter()
+        for season in seasons or ():
+            counts.update(self.season_counts.get(season, {}))
+        for code in episodes or ():
+            if seasons is None or int(code[:2]) not in seasons:  # серии из уже учтенных сезонов не считаются дважды
+                counts.update(self.episode_counts.get(code, {}))
+        return counts
+
+    def frequency(self, word, seasons=None, episodes=None):
+        return self.counts(seasons, episodes)[word]
+
+    # Список k самых частых слов вида [(слово, частота)] (при k=None - всех слов), от более частых к менее частым
+    def top(self, k=None, seasons=None, episodes=None):
+        counts = self.counts(seasons, episodes)
+        if k is None:
+            return sorted(counts.items(), key=itemgetter(1), reverse=True)
+        return heapq.nlargest(k, counts.items(), key=itemgetter(1))
+
+
+# Функция для записи частотного словаря: для каждого слова указывается число серий, в словарях к которым оно
+# встречается, само слово и его перевод
+def write_frequency_dictionary(frequency_index, path='frequency_dictionary.txt', k=None, seasons=None, episodes=None):
+    lines = []
+    for word_counted, frequency in frequency_index.top(k, seasons, episodes):
+        frequency = str(frequency)
+        lines.append(frequency + ' ' * {3: 6, 2: 7}.get(len(frequency), 8) + word_counted +
+                     frequency_index.translations[word_counted] + '\n')
+    write_file_atomically(path, ''.join(lines))
+
+
+# Функция для получения хэша (отпечатка) текста, по которому определяется, изменились ли входные данные этапа
+def get_hash(*parts):
+    return hashlib.sha1('\0'.join(parts).encode('utf-8')).hexdigest()
+
+
+# Функция для пересборки словарей только для тех серий, тексты которых изменились. В файле manifest_path для каждой
+# серии хранятся хэши входных данных трех этапов: очистки текста (preprocess), получения слов на перевод (annotate) и
+# перевода (translate). Этап для серии выполняется заново, только если хэш его входных данных изменился, после чего
+# обновляются и последующие этапы. Тексты серий, частотный словарь и сам манифест перезаписываются целиком (через
+# временный файл), а словари к сериям - в хранилище VocabularyStore. Если часть слов серии не удалось перевести из-за
+# сетевых ошибок, хэш перевода для серии не сохраняется, и при следующем запуске она переводится снова (уже
+# переведенные слова берутся из кэша). Если указан stats_path, в него записывается статистика по этапам (stats).
+# Возвращает список пересобранных серий
+def rebuild(stopwords, source_path='preprocessed_transcripts.txt', transcripts_path='transcripts.jsonl',
+            manifest_path='build_manifest.json', frequency_path='frequency_dictionary.txt', vocabulary_store=None,
+            translation_cache=None, checkpoint_dir='annotations', fetcher=None, backends=None, stats_path=None,
+            **annotate_options):
+    manifest = {}  # словарь вида {номер серии: {этап: хэш входных данных этапа}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    old_transcripts = dict(iter_transcripts(transcripts_path)) if os.path.exists(transcripts_path) else {}
+    own_store = vocabulary_store is None
+    if own_store:
+        vocabulary_store = VocabularyStore()
+    own_cache = translation_cache is None
+    if own_cache:
+        translation_cache = TranslationCache()
+
+    def save_manifest():
+        write_file_atomically(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=1))
+
+    rebuilt_episodes = []
+    try:
+        # этап 1: очистка текстов серий
+        transcripts = {}
+        for key, raw_text in iter_raw_episodes(source_path):
+            stages = manifest.setdefault(key, {})
+            raw_hash = get_hash(raw_text)
+            if stages.get('preprocess') == raw_hash and key in old_transcripts:
+                transcripts[key] = old_transcripts[key]
+            else:
+                transcripts[key] = clean_episode_text(raw_text)
+                stages['preprocess'] = raw_hash
+        write_transcripts(transcripts.items(), transcripts_path)
+        removed_episodes = [key for key in list(manifest) if key not in transcripts]
+        for key in removed_episodes:  # серии, которых больше нет в исходном файле, удаляются отовсюду
+            del manifest[key]
+            vocabulary_store.delete_episode(key)
+        save_manifest()
+
+        # этап 2: получение слов на перевод (заново обрабатываются и серии, которые еще не переведены, но сохраненного
+        # списка слов для которых нет)
+        stopwords_hash = get_hash(*stopwords)
+        episodes_checkpoint_dir = get_checkpoint_dir(checkpoint_dir, stopwords)
+        stored_episodes = set(vocabulary_store.episodes())
+        stale_episodes = {}
+        for key, text in transcripts.items():
+            checkpoint_path = os.path.join(episodes_checkpoint_dir, key + '.json')
+            needs_translation = key not in stored_episodes or 'translate' not in manifest[key]
+            if manifest[key].get('annotate') != get_hash(stopwords_hash, text) or \
+                    needs_translation and not os.path.exists(checkpoint_path):
+                if os.path.exists(checkpoint_path):  # сохраненный результат устарел
+                    os.remove(checkpoint_path)
+                stale_episodes[key] = text
+        annotated_episodes = {}
+        for key, words_list in annotate_episodes(stale_episodes, stopwords, checkpoint_dir=checkpoint_dir,
+                                                 **annotate_options):
+            annotated_episodes[key] = words_list
+            manifest[key]['annotate'] = get_hash(stopwords_hash, transcripts[key])
+            save_manifest()
+
+        # этап 3: перевод слов (заново переводятся серии, у которых изменился список слов или которых нет в хранилище)
+        for key in transcripts:
+            if key in annotated_episodes:
+                words_list = annotated_episodes[key]
+            elif key not in stored_episodes or 'translate' not in manifest[key]:
+                with open(os.path.join(episodes_checkpoint_dir, key + '.json'), 'r',
+                          encoding='utf-8') as checkpoint_file:
+                    words_list = json.load(checkpoint_file)
+            else:
+                continue
+            words_hash = get_hash(*words_list)
+            if manifest[key].get('translate') == words_hash and key in stored_episodes:
+                continue
+            failed_words = []
+            with stats.stage('translation', key):
+                vocabulary_store.put_episode(key, fetch_translations(words_list, translation_cache, fetcher,
+                                                                     backends=backends, failed_words=failed_words))
+            if failed_words:  # словарь к серии неполный: при следующем запуске серия переводится снова
+                manifest[key].pop('translate', None)
+            else:
+                manifest[key]['translate'] = words_hash
+            save_manifest()
+            rebuilt_episodes.append(key)
+        if rebuilt_episodes or removed_episodes or not os.path.exists(frequency_path):
+            write_frequency_dictionary(FrequencyIndex(vocabulary_store.items()), frequency_path)
+    finally:
+        if own_store:
+            vocabulary_store.close()
+        if own_cache:
+            translation_cache.close()
+        if stats_path is not None:  # статистика по этапам и сериям записывается в формате json
+            stats.write_json(stats_path)
+    return rebuilt_episodes
+
+
+TRANSCRIPTS_INDEX_URL = 'https://bigbangtrans.wordpress.com/'  # ссылка на страницу со списком серий
+
+
+# Функция для извлечения текста серии из исходного кода страницы: разбираются только div с классом entrytext
+def parse_transcript_page(html, parser=TRANSCRIPT_PARSER):
+    with stats.stage('html_parsing'):
+        child_soup = BeautifulSoup(html, parser, parse_only=SoupStrainer('div', class_='entrytext'))
+    episode_text = []
+    for child_tag in child_soup.find_all('div', class_='entrytext'):  # находим и добавляем в список тексты серий
+        for content in child_tag.find_all('p'):
+            episode_text.append(content.text.strip().replace('\n\n', '\n'))
+    return '\n'.join(episode_text)
+
+
+# Функция для скачивания текстов серий: страницы серий скачиваются одновременно (через PooledFetcher), а для уже
+# скачанных ранее страниц отправляется условный запрос (If-None-Match/If-Modified-Since), поэтому неизменившиеся
+# страницы сервер повторно не отдает (ответ 304). Названия, тексты серий и заголовки ETag/Last-Modified сохраняются
+# в state_path после каждой страницы, поэтому прерванное скачивание можно продолжить. В конце тексты всех серий
+# в порядке их следования на сайте записываются в output_path. Возвращает список названий изменившихся серий
+def scrape_transcripts(index_url=TRANSCRIPTS_INDEX_URL, output_path='transcripts.txt', state_path='scrape_state.json',
+                       fetcher=None, max_workers=8, parser=TRANSCRIPT_PARSER):
+    state = {}  # словарь вида {ссылка: {'name': ..., 'etag': ..., 'last_modified': ..., 'text': ...}}
+    if os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as state_file:
+            state = json.load(state_file)
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = PooledFetcher()
+
+    def fetch_page(episode_name, child_url):
+        headers = {}
+        page_state = state.get(child_url)
+        if page_state and page_state.get('etag'):
+            headers['If-None-Match'] = page_state['etag']
+        if page_state and page_state.get('last_modified'):
+            headers['If-Modified-Since'] = page_state['last_modified']
+        with stats.stage('html_fetch') as record:
+            child_url_response = fetcher.get(child_url, headers=headers)
+            record(requests=1, bytes=len(child_url_response.content))
+        if child_url_response.status_code == 304 and page_state:
+            stats.add('html_fetch', cache_hits=1)
+            return None
+        child_url_response.raise_for_status()
+        return {'name': episode_name, 'etag': child_url_response.headers.get('ETag'),
+                'last_modified': child_url_response.headers.get('Last-Modified'),
+                'text': parse_transcript_page(child_url_response.text, parser)}
+
+    try:
+        url_response = fetcher.get(index_url)  # получаем список серий
+        url_response.raise_for_status()
+        soup = BeautifulSoup(url_response.text, parser, parse_only=SoupStrainer('a'))
+        episode_pages = {}  # словарь вида {ссылка: название серии}
+        for tag in soup.find_all('a'):  # итерируемся по всем тэгам a, чтобы найти тексты серий
+            if 'episode' in tag.get('href', ''):  # проверяем, есть ли в ссылках внутри этих тэгов строка episode
+                episode_pages.setdefault(tag['href'], tag.text)
+        changed_episodes = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(fetch_page, name, child_url): child_url
+                       for child_url, name in episode_pages.items()}
+            for future in as_completed(futures):
+                try:
+                    page_state = future.result()
+                except rq.RequestException:  # страница не скачалась: остается ее прежний текст (если он был)
+                    continue
+                if page_state is not None:
+                    state[futures[future]] = page_state
+                    changed_episodes.append(page_state['name'])
+                    write_file_atomically(state_path, json.dumps(state, ensure_ascii=False))
+    finally:
+        if own_fetcher:
+            fetcher.close()
+    # записываем тексты серий в файл
+    write_file_atomically(output_path, ''.join(state[child_url]['name'] + '\n\n' + state[child_url]['text'] +
+                                               '\n\n\n' for child_url in episode_pages if child_url in state))
+    return changed_episodes
+
+
+# # Скачиваем тексты серий (при повторном запуске скачиваются только изменившиеся страницы) и записываем их в файл
+# scrape_transcripts(TRANSCRIPTS_INDEX_URL, 'transcripts.txt')
 #
 # with open('transcripts.txt', 'r', encoding='utf-8') as transcript_file:
 #     with open('preprocessed_transcripts.txt', 'a', encoding='utf-8') as preprocessed_transcript_file:
@@ -171,44 +1139,14 @@ def get_translations(words_list):
 #         preprocessed_transcript_file.write(result)
 #
 #
-# # Создаем словарь формата "(номер эпизода + номер серии, напр., 0101): текст серии, очищенный от лишних слов, фраз, \
-# # которые не произносятся героями (напр., описание места действия или указание говорящего), знаков препинания, \
-# # ненужных элементов и пробелов".
-# with open('preprocessed_transcripts.txt', 'r', encoding='utf-8') as corpus:
-#     document = corpus.read()
-#     transcript_dict = {}
-#     series_episode_pattern = 'Series (\\d{2}) Episode (\\d{2}) – [\\w\\W]*?\n([\\w\\W]*?)(?=\n^\n)'
-#     series_episode_found_list = re.findall(series_episode_pattern, document, flags=re.MULTILINE)
-#     for elem in series_episode_found_list:
-#         key = elem[0] + elem[1]
-#         new_document = elem[2]
-#         new_document = re.sub(r'^[^:]*?\n', '', new_document, flags=re.MULTILINE)
-#         new_document = re.sub(r'^(Scene:|Teleplay:|Story:|Written by) [\w\W]*?(?=$)', '', new_document,
-#                               flags=re.MULTILINE)
-#         new_document = re.sub(r'^[\w\W]*?: ', '', new_document, flags=re.MULTILINE)
-#         new_document = re.sub(r'\([\w\W]*?\)[,: ]*', '', new_document, flags=re.MULTILINE)
-#         new_document = re.sub(r'\s\s', ' ', new_document, flags=re.MULTILINE)
-#         new_document = re.sub(r'\.\s\.\.', '…', new_document, flags=re.MULTILINE)
-#         new_document = re.sub(r'(?<=[.!,?…])\s\.', '', new_document, flags=re.MULTILINE)
-#         new_document = re.sub(r'\s\.', '.', new_document, flags=re.MULTILINE)
-#         new_document = re.sub(r'%', ' percent', new_document, flags=re.MULTILINE)  # json "спотыкается" о символ %
-#         transcript_dict[key] = new_document
-#
+# # Очищаем тексты серий от лишних слов, фраз, которые не произносятся героями (напр., описание места действия или \
+# # указание говорящего), ненужных элементов и пробелов и построчно записываем их в файл в виде пар "номер эпизода + \
+# # номер серии, напр., 0101 - текст серии"
+# preprocess_transcripts('preprocessed_transcripts.txt', 'transcripts.jsonl')
 #
-# # Для облегчения дальнейшей работы со словарем, содержащим тексты серий, записываем его в файл
-# with open('transcript_dictionary.txt', 'w', encoding='utf-8') as dict_to_fill:  # открываем нужный файл для записи
-#     transcript_file = str(transcript_dict)  # превращаем словарь в строку
-#     transcript_file = re.sub(r'\\xa0', '', transcript_file)  # удаляем из нее лишние случайные символы
-#     transcript_file = re.sub(r'\s\s', ' ', re.sub(r'\\n', ' ', transcript_file))  # также заменяем лишние переносы
-#     # строк на пробелы и двойные пробелы на одинарные
-#     dict_to_fill.write(transcript_file)  # записываем словарь в файл
-#
-# # Извлекаем словарь с текстами серий из файла для последующего использования
-# with open('transcript_dictionary.txt', 'r', encoding='utf-8') as file_to_use:  # открываем нужный файл для чтения
-#     read_string = file_to_use.read()  # считываем файл
-#     number_list = re.findall(r'(?<=\')[^:,][\w\W]*?(?=\')', read_string)  # находим все элементы вида 'текст'
-#     v = iter(number_list)  # итерируем полученный список элементов
-#     dict_to_use = {s: next(v) for s in v}  # создаем словарь, ключи которого - номера серий, а значения - их тексты
+# # Извлекаем тексты серий из файла для последующего использования
+# dict_to_use = dict(iter_transcripts('transcripts.jsonl'))  # создаем словарь, ключи которого - номера серий, а \
+# # значения - их тексты
 #
 # with open('stopwords+words_already_known.txt', 'r', encoding='utf-8') as stop_file:  # открываем файл, в который
 #     # добавлены стоп-слова и первые 1 500 слов из частотного списка для английского языка
@@ -216,92 +1154,76 @@ def get_translations(words_list):
 #     stopwords = re.findall(r'\'(\S*)\'', read_file[0])  # извлекаем из него список стоп-слов, которые не будут
 #     # учитываться при поиске слов для перевода
 #
-# with open('translations_dict.txt', 'a', encoding='utf-8') as corp:  # открываем файл для записи посерийного словаря
-#     keys = dict_to_use.keys()  # в качестве ключей берем ключи созданного выше словаря (т. е. номера серий)
-#     for key in dict_to_use.keys():  # проходимся по каждому ключу
-#         dict_to_use[key] = [word for word in get_words_to_be_translated(dict_to_use[key], stopwords)]  # получаем
-# # слова, которые необходимо перевести для каждой серии, с помощью функции get_words_to_be_translated
-#         dict_to_use[key] = get_translations(dict_to_use[key])  # получаем списки этих слов вместе с их переводами \
-# # с помощью функции get_translations
-#         regex = re.compile("\'[\\s?а-яА-я\']*?\'", re.S)
-#         dict_to_use[key] = {k: regex.sub(lambda m: m.group().replace("\'", '\"', 2), v) for k, v in
-#                             dict_to_use[key].copy().items()}  # заменяем одинарные кавычки на двойные в переводе
-#         # слова, чтобы они не мешали дальнейшему считыванию элементов словаря
-#     values = dict_to_use.values()  # в качестве значений берем полученные списки слов с их переводами
-#     translation_dict = dict(zip(keys, values))  # создаем словарь, где ключи - это номера серий, а значения - списки \
-#     # слов с переводами
-#     corp.write(str(translation_dict))  # записываем словарь в файл для облегчения дальнейшей работы
-
-
-# Извлекаем заранее составленный словарь для нужной серии из файла со словарями
-with open('translations_dict.txt', 'r', encoding='utf-8') as string_to_read:  # открываем файл
-    read_string = string_to_read.read()  # прочитываем его
-    numbers_list = re.findall(r'(?<=\')\d{4}(?=\': {)', read_string)  # находим все номера серий
-    translations_list = re.findall(r'(?<=\'\d{4}\': {)[\w\W]*?(?=})', read_string)  # находим все строки со словарями
-    keys = [re.findall(r'(?<=\')[^:\s,][\w\W]*?(?=\':)', translation) for translation in translations_list]  # находим
-    # в найденных строках все слова для каждой серии
-    values = [re.findall(r'(?<=\': \')\s[\w\W]*?(?=\')', translation) for translation in translations_list]  # находим
-    # в найденных строках все переводы этих слов
-    tr_dicts = [dict(zip(keys[i], values[i])) for i in range(len(keys))]  # создаем словари для всех серий
-    translations_dict = dict(zip(numbers_list, tr_dicts))  # создаем словарь вида {номер серии: словарь к серии}
-
-
-# Просим пользователя указать сезон и номер серии для вывода словаря
-series_episode = input("\nКакой сезон и какую серию хочешь посмотреть? Введи их без пробела, например, 0907: ")
-print()
-# Вывод словаря к серии
-for key in translations_dict[series_episode].keys():
-    print(key, translations_dict[series_episode][key], sep='')
-
-# # Если нужно записать словарь к серии в файл:
-# with open('episode_vocabulary.txt', 'a', encoding='utf-8') as vocabulary_file:
-#     for key in translations_dict[series_episode].keys():  # выводим словарь для нужной серии
-#         vocabulary_file.write(key)
-#         vocabulary_file.write(' ')
-#         vocabulary_file.write(translations_dict[series_episode][key])
-#         vocabulary_file.write('\n')
-#
-# # Запись частотного словаря в файл для ускорения его вывода в дальнейшем
-# with open('frequency_dictionary.txt', 'a', encoding='utf-8') as frequency_file:
-#     words_to_count_list = []  # создаем список всех слов из словаря по сериалу, включая повторяющиеся
-#     for value in translations_dict.values():
-#         for keys in value:
-#             words_to_count_list.append(keys)
-#     words_to_count_set = list(set(words_to_count_list))  # превращаем этот список во множество для исключения \
-#     # повторяющихся слов и сохраняем его в виде другого списка
-#     frequency_dict = {word: words_to_count_list.count(word) for word in words_to_count_set}  # создаем частотный
-#     # словарь, записывая каждое слово из списка без повторений и его частоту, подсчитанную в списке с повторениями
-#     for word_counted in sorted(frequency_dict, key=frequency_dict.get, reverse=True):
-#         for values in translations_dict.values():  # ищем перевод каждого слова в словарях к сериям,
-#             if word_counted in values:  # ... если это слово в них встречается,
-#                 word_translation = values.get(word_counted)  # а после того, как перевод нашелся,
-#                 break  # прерываем поиск перевода, т. к. одно и то же слово может встречаться в разных сериях
-#         frequency_file.write(str(frequency_dict[word_counted]))  # выводим частоту
-#         # слова, само слово и его перевод для всех слов
-#         if len(str(frequency_dict[word_counted])) == 3:
-#             frequency_file.write('      ')
-#         elif len(str(frequency_dict[word_counted])) == 2:
-#             frequency_file.write('       ')
-#         else:
-#             frequency_file.write('        ')
-#         frequency_file.write(word_counted)
-#         frequency_file.write(word_translation)
-#         frequency_file.write('\n')
+# # Если нужно обновить словари только для добавленных или исправленных серий, вместо всех шагов выше и ниже достаточно
+# # вызвать rebuild(stopwords)
 #
-#
-# # Вывод частотного словаря по всему сериалу, состоящего из слов, которые нужно выучить
-# print('\n\n')
-# with open('frequency_dictionary.txt', 'r', encoding='utf-8') as word_frequency_file:
-#     freq_file = word_frequency_file.readlines()
-#     [print(line, end='') for line in freq_file]
-#
-# Добавление знакомых слов в список изученных для последующего удаления из переведенного набора слов
-already_learned_words = input('\n\nДобавить слова в изученные (слова вводятся через пробел): ')
-print('\n\n')
-already_learned_words = already_learned_words.split()
-
-# Удаление лишних (добавленных в изученные) слов из переведенного набора слов
-already_learned_words_set = frozenset(already_learned_words)
-translation_list = [key for key in translations_dict[series_episode].keys() if key not in already_learned_words_set]
-for key in translation_list:
-    print(key, translations_dict[series_episode][key], sep='')
+# vocabulary_store = VocabularyStore()  # открываем хранилище посерийных словарей
+# translation_cache = TranslationCache()  # общий для всех серий кэш переводов
+# for key, words_to_translate in annotate_episodes(dict_to_use, stopwords):  # получаем слова, которые необходимо
+#     # перевести для каждой серии, с помощью функции annotate_episodes (серии приходят по мере готовности)
+#     dict_to_use[key] = fetch_translations(words_to_translate, translation_cache)  # получаем списки этих слов вместе
+#     # с их переводами с помощью функции fetch_translations (чтобы сначала искать слова в уже составленном частотном
+#     # словаре, а на сайтах - только не найденные в нем, нужно один раз создать файл build_offline_dictionary() и
+#     # передать fetcher=fetcher, backends=[OfflineDictionaryBackend(), *get_network_backends(fetcher.get)], где
+#     # fetcher = PooledFetcher())
+#     vocabulary_store.put_episode(key, dict_to_use[key])  # записываем словарь к серии в хранилище
+# translation_cache.close()
+# vocabulary_store.close()
+# stats.write_json('pipeline_stats.json')  # записываем время работы, число запросов и т. д. по этапам и сериям
+
+
+if __name__ == '__main__':
+    # Открываем хранилище посерийных словарей (при первом запуске оно заполняется из файла translations_dict.txt).
+    # Словарь к серии считывается из хранилища только по запросу, поэтому весь файл при запуске больше не разбирается
+    vocabulary_store = VocabularyStore()
+    if not vocabulary_store.episodes() and os.path.exists('translations_dict.txt'):
+        vocabulary_store.import_translations_dict('translations_dict.txt')
+
+    # Режим диалога: python Python_Project_CL.py --repl
+    if sys.argv[1:] == ['--repl']:
+        run_repl(vocabulary_store)
+        vocabulary_store.close()
+        sys.exit()
+
+    # Просим пользователя указать сезон и номер серии для вывода словаря
+    series_episode = input("\nКакой сезон и какую серию хочешь посмотреть? Введи их без пробела, например, 0907: ")
+    print()
+    episode_vocabulary = vocabulary_store.episode(series_episode)
+    # Вывод словаря к серии
+    for key in episode_vocabulary.keys():
+        print(key, episode_vocabulary[key], sep='')
+
+    # # Если нужно записать словарь к серии в файл:
+    # with open('episode_vocabulary.txt', 'a', encoding='utf-8') as vocabulary_file:
+    #     for key in episode_vocabulary.keys():  # выводим словарь для нужной серии
+    #         vocabulary_file.write(key)
+    #         vocabulary_file.write(' ')
+    #         vocabulary_file.write(episode_vocabulary[key])
+    #         vocabulary_file.write('\n')
+    #
+    # # Запись частотного словаря в файл для ускорения его вывода в дальнейшем
+    # frequency_index = FrequencyIndex(vocabulary_store.items())  # считаем частоты слов по всем сериям
+    # write_frequency_dictionary(frequency_index, 'frequency_dictionary.txt')
+    # # Частотный словарь только по части сериала считается без повторного подсчета, напр., 100 самых частых слов
+    # # в 3-5 сезонах: frequency_index.top(100, seasons=range(3, 6)) или в нескольких сериях:
+    # # frequency_index.top(100, episodes=['0101', '0102'])
+    #
+    #
+    # # Вывод частотного словаря по всему сериалу, состоящего из слов, которые нужно выучить
+    # print('\n\n')
+    # with open('frequency_dictionary.txt', 'r', encoding='utf-8') as word_frequency_file:
+    #     freq_file = word_frequency_file.readlines()
+    #     [print(line, end='') for line in freq_file]
+    #
+    # Добавление знакомых слов в список изученных для последующего удаления из переведенного набора слов
+    already_learned_words = input('\n\nДобавить слова в изученные (слова вводятся через пробел): ')
+    print('\n\n')
+    already_learned_words = already_learned_words.split()
+
+    # Удаление лишних (добавленных в изученные сейчас или ранее) слов из переведенного набора слов
+    vocabulary_store.add_learned_words(already_learned_words)  # изученные слова сохраняются для следующих запусков
+    already_learned_words_set = frozenset(vocabulary_store.learned_words())
+    translation_list = [key for key in episode_vocabulary.keys() if key not in already_learned_words_set]
+    for key in translation_list:
+        print(key, episode_vocabulary[key], sep='')
+    vocabulary_store.close()
@@ -0,0 +1,358 @@
+import argparse
+import ast
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import Python_Project_CL as pipeline
+from fixtures import start_server, read_page
+
+# Набор замеров скорости этапов обработки без доступа к сети и к серверу Stanford, чтобы замедление любого этапа
+# было видно по цифрам. Все данные берутся из файлов проекта (transcript_dictionary.txt, preprocessed_transcripts.txt,
+# frequency_dictionary.txt) и сохраненных страниц сайтов из папки test_pages, а вместо сайтов и сервера Stanford
+# запускаются локальные серверы, которые отдают заранее подготовленные ответы:
+# - сохраненных ответов сервера Stanford нет, поэтому разметка текста строится приблизительно (каждое слово -
+#   существительное, лемма - слово в нижнем регистре, у каждого слова есть зависимость от предыдущего, а частицы up,
+#   out и т. д. после слова образуют зависимость compound:prt), но по размеру она близка к настоящему ответу сервера;
+# - для слов, страницы которых сохранены в test_pages, отдаются эти страницы, а для слов, которых нет на сайте, -
+#   сохраненная страница "слово не найдено". Страницы остальных слов собираются по переводам из частотного словаря и
+#   повторяют только те элементы разметки, которые нужны функциям translate_with_wooordhunt и
+#   translate_with_multitran, а по размеру дополняются до 20 КБ;
+# - разбор страниц с текстами серий замеряется на сохраненных страницах сайта.
+# Результаты сравниваются с базовыми из benchmark_baseline.json (они записаны на машине разработчика, поэтому на другой
+# машине базовые значения нужно сначала записать заново с флагом --update-baseline): если скорость какого-либо этапа
+# упала больше чем на tolerance (по умолчанию 50 %) или ухудшился результат (доля найденных слов и т. д.), список
+# ухудшений выводится в конце, а программа завершается с кодом 1.
+# Запуск: python benchmark.py [число первых серий для замера] [файл для записи результатов в формате json]
+# [--baseline файл] [--tolerance 0.5] [--update-baseline]
+
+PARTICLES = frozenset(['up', 'out', 'on', 'off', 'down', 'away', 'back', 'over', 'in'])
+SENTENCE_PATTERN = re.compile(r'[^.!?…]+[.!?…]*')
+TOKEN_PATTERN = re.compile(r'[\w’\'-]+|[^\w\s]')
+TRANSCRIPTION_PATTERN = re.compile(r'^ ?(?:\(.*?\) ?)?(\|.*?\||\[.*?\])? ?[-–] (.*)$')
+PAGE_PADDING = '<div class="menu"><a href="/">ссылка</a></div>\n' * 200  # примерно 10 КБ разметки
+TRANSLATED_WORDS_COUNT = 200  # число слов для замера скачивания и разбора страниц
+RECORDED_PAGES = {('wooordhunt', 'world'): 'wooordhunt_world.html', ('wooordhunt', 'take'): 'wooordhunt_take.html',
+                  ('multitran', 'give up'): 'multitran_give_up.html'}  # сохраненные страницы слов
+NOT_FOUND_PAGES = {'wooordhunt': 'wooordhunt_not_found.html', 'multitran': 'multitran_not_found.html'}
+TRANSCRIPT_PAGES = ['transcript_0101.html', 'transcript_0102.html', 'transcript_0103.html']
+TRANSCRIPT_PARSING_REPEATS = 40  # сохраненных страниц с текстами серий мало, поэтому каждая разбирается много раз,
+TRANSCRIPT_PARSING_ROUNDS = 5  # а из нескольких замеров берется лучший
+BASELINE_PATH = 'benchmark_baseline.json'
+TOLERANCE = 0.5
+MIN_SECONDS_DIFFERENCE = 0.01  # меньшая разница во времени этапа не считается ухудшением (это погрешность замера)
+
+
+# Функция для построения разметки текста в формате ответа сервера Stanford
+def make_sentences(text):
+    sentences = []
+    for sentence_match in SENTENCE_PATTERN.finditer(text):
+        tokens = []
+        dependencies = []
+        for index, token_match in enumerate(TOKEN_PATTERN.finditer(sentence_match.group()), start=1):
+            word = token_match.group()
+            tokens.append({'index': index, 'word': word, 'lemma': word.lower(),
+                           'pos': 'NN' if word[0].isalnum() else '.',
+                           'characterOffsetBegin': sentence_match.start() + token_match.start()})
+            if index > 1:
+                dependencies.append({'dep': 'compound:prt' if word.lower() in PARTICLES else 'dep',
+                                     'governor': index - 1, 'governorGloss': tokens[-2]['word'],
+                                     'dependent': index, 'dependentGloss': word.lower()})
+        if tokens:
+            sentences.append({'tokens': tokens, 'basicDependencies': dependencies})
+    return sentences
+
+
+# Прежняя реализация отбора слов (до перехода на один проход), сохраненная для сравнения
+def legacy_extract_words(sentences, unwanted_words):
+    pos_deletion_list = ['PRP', 'DT', 'IN', 'TO', 'NNP', 'CC', 'CD', 'EX', 'JJR', 'JJS', 'LS', 'MD', 'PDT', 'RP',
+                         'PRP$', 'RBR', 'RBS', 'UH', 'WDT', 'WP', 'WP$', 'WRB', 'NNPS', 'POS', 'SYM']
+    words_list = []
+    for sentence in sentences:
+        for word in sentence["tokens"]:
+            if word["pos"] not in pos_deletion_list and word["lemma"] not in unwanted_words and len(word["lemma"]) > 1 \
+                    and word["lemma"] not in words_list:
+                words_list.append(word["lemma"])
+            for dep in sentence["basicDependencies"]:
+                if dep['dep'] == "compound:prt" and word["word"] == dep["governorGloss"]:
+                    dep["governorGloss"] = word["lemma"]
+                    phrasal_verb = dep["governorGloss"] + ' ' + dep["dependentGloss"]
+                    if phrasal_verb not in words_list:
+                        words_list.append(phrasal_verb)
+    unhyphenated_words_list = []
+    for word in words_list:
+        if '-' not in word:
+            unhyphenated_words_list.append(word)
+        else:
+            if re.search(r'\w-\w-', word):
+                continue
+            else:
+                split_list = (re.sub(r'-', ' ', word)).split()
+                word_parts_list = []
+                [word_parts_list.append(word_part) for word_part in split_list if word_part not in word_parts_list and
+                 word_part not in unhyphenated_words_list and len(word_part) > 1]
+                unhyphenated_words_list.extend(word_parts_list)
+                if not word.startswith('un-'):
+                    unhyphenated_words_list.append(word)
+    final_list = []
+    for word in unhyphenated_words_list:
+        if word in unwanted_words or re.search(r'\d+', word) or not re.search(r'[a-zA-Z]', word):
+            continue
+        else:
+            final_list.append(word)
+    return final_list
+
+
+# Отбор слов на перевод: прежняя и текущая реализации на одной и той же разметке
+def benchmark_word_extraction(episodes, stopwords):
+    results = {}
+    for name, function in (('legacy', legacy_extract_words), ('current', pipeline.extract_words)):
+        annotated_episodes = {key: make_sentences(text) for key, text in episodes.items()}  # legacy_extract_words
+        # меняет разметку, поэтому для каждой реализации она строится заново
+        tokens_count = sum(len(sentence['tokens']) for sentences in annotated_episodes.values()
+                           for sentence in sentences)
+        started = time.perf_counter()
+        words = {key: function(sentences, stopwords) for key, sentences in annotated_episodes.items()}
+        results[name] = {'tokens_per_second': tokens_count / (time.perf_counter() - started), 'words': words}
+    same = all(results['current']['words'][key] == list(dict.fromkeys(results['legacy']['words'][key]))
+               for key in episodes)
+    return {'legacy_tokens_per_second': results['legacy']['tokens_per_second'],
+            'tokens_per_second': results['current']['tokens_per_second'], 'same_result': same}
+
+
+# Очистка текстов серий из preprocessed_transcripts.txt
+def benchmark_preprocessing(directory):
+    source_size = os.path.getsize('preprocessed_transcripts.txt')
+    started = time.perf_counter()
+    episodes_count = pipeline.preprocess_transcripts('preprocessed_transcripts.txt',
+                                                     os.path.join(directory, 'transcripts.jsonl'))
+    seconds = time.perf_counter() - started
+    return {'episodes_per_second': episodes_count / seconds, 'megabytes_per_second': source_size / seconds / 2 ** 20}
+
+
+# Разметка серий на локальном сервере, который отдает заранее подготовленные ответы в формате сервера Stanford
+def benchmark_annotation(episodes, stopwords, directory, batch_size=4):
+    items = list(episodes.items())
+    canned_responses = {}  # словарь вида {текст запроса: ответ}
+    for i in range(0, len(items), batch_size):
+        joined_text = '\n\n'.join(text for _, text in items[i:i + batch_size])
+        canned_responses[joined_text] = json.dumps({'sentences': make_sentences(joined_text)}).encode('utf-8')
+
+    def respond(handler):
+        if handler.command == 'GET':  # pycorenlp проверяет, что сервер запущен
+            return 200, b''
+        return 200, canned_responses[handler.rfile.read(int(handler.headers['Content-Length'])).decode('utf-8')]
+
+    server, url = start_server(respond)
+    try:
+        started = time.perf_counter()
+        annotated = dict(pipeline.annotate_episodes(episodes, stopwords, endpoints=(url,), batch_size=batch_size,
+                                                    checkpoint_dir=os.path.join(directory, 'annotations')))
+        seconds = time.perf_counter() - started
+    finally:
+        server.shutdown()
+    return {'episodes_per_second': len(annotated) / seconds}, annotated
+
+
+# Страница wooordhunt или multitran для слова из частотного словаря (None - слова на сайте нет)
+def make_page(site, word, translation):
+    match = TRANSCRIPTION_PATTERN.match(translation)
+    transcription, meanings = (match.group(1) or '', match.group(2)) if match else ('', translation)
+    if site == 'wooordhunt':
+        if '|' not in transcription:
+            return None
+        return (f'<html><body>{PAGE_PADDING}<div id="wd_title"><div class="trans_sound"><span> {transcription}'
+                f'</span></div></div><div class="t_inline_en">{meanings}</div>{PAGE_PADDING}</body></html>')
+    links = ' '.join(f'<a href="#">{meaning.strip()}</a>' for meaning in re.split(r'[;,]', meanings)[:4])
+    return (f'<html><body>{PAGE_PADDING}<div class="middle_col"></div><div class="middle_col"></div>'
+            f'<div class="middle_col"><table><tr><td></td></tr><tr><td><a href="#">{word}</a>'
+            f'<span>{transcription}</span></td></tr><tr><td></td><td>{links}</td></tr></table></div>'
+            f'{PAGE_PADDING}</body></html>')
+
+
+# Скачивание и разбор страниц с переводами слов с локального сервера через fetch_translations
+def benchmark_translation_fetch(dictionary_entries):
+    pages = {}  # словарь вида {(сайт, слово): страница}
+    for word, translation in dictionary_entries:
+        for site in ('wooordhunt', 'multitran'):
+            page = make_page(site, word, translation)
+            if page is not None:
+                pages[site, word] = page.encode('utf-8')
+    pages.update({site_word: read_page(file_name) for site_word, file_name in RECORDED_PAGES.items()})
+    not_found_pages = {site: read_page(file_name) for site, file_name in NOT_FOUND_PAGES.items()}
+
+    def respond(handler):
+        url = urlsplit(handler.path)
+        if url.path.startswith('/word/'):
+            site, word = 'wooordhunt', unquote(url.path[len('/word/'):])
+        else:
+            site, word = 'multitran', parse_qs(url.query)['s'][0]
+        return 200, pages.get((site, word), not_found_pages[site])
+
+    server, url = start_server(respond)
+    urls = pipeline.WOOORDHUNT_URL, pipeline.MULTITRAN_URL
+    pipeline.WOOORDHUNT_URL, pipeline.MULTITRAN_URL = url + '/word/', url + '/m.exe?l1=1&l2=2&s='
+    fetcher = pipeline.PooledFetcher(max_per_host=8, rate_per_host=10000)
+    try:
+        words = list(dict.fromkeys([word for word, _ in dictionary_entries] + [word for _, word in RECORDED_PAGES]))
+        started = time.perf_counter()
+        translations = pipeline.fetch_translations(words, fetcher=fetcher)
+        seconds = time.perf_counter() - started
+    finally:
+        pipeline.WOOORDHUNT_URL, pipeline.MULTITRAN_URL = urls
+        fetcher.close()
+        server.shutdown()
+    return {'words_per_second': len(words) / seconds, 'found_share': len(translations) / len(words)}
+
+
+# Разбор сохраненных страниц с текстами серий: через парсер, который используется по умолчанию (lxml, если он
+# установлен), и через html.parser
+def benchmark_transcript_parsing():
+    pages = [read_page(file_name).decode('utf-8') for file_name in TRANSCRIPT_PAGES]
+    results = {}
+    for metric, parser in (('pages_per_second', pipeline.TRANSCRIPT_PARSER),
+                           ('html_parser_pages_per_second', 'html.parser')):
+        rounds_seconds = []
+        for _ in range(TRANSCRIPT_PARSING_ROUNDS):
+            started = time.perf_counter()
+            for _ in range(TRANSCRIPT_PARSING_REPEATS):
+                for page in pages:
+                    pipeline.parse_transcript_page(page, parser)
+            rounds_seconds.append(time.perf_counter() - started)
+        results[metric] = len(pages) * TRANSCRIPT_PARSING_REPEATS / min(rounds_seconds)
+    return results
+
+
+# Загрузка посерийных словарей: разбор всего файла translations_dict.txt и открытие одной серии из VocabularyStore
+def benchmark_vocabulary_loading(vocabularies, directory):
+    translations_path = os.path.join(directory, 'translations_dict.txt')
+    with open(translations_path, 'w', encoding='utf-8') as translations_file:
+        translations_file.write(str(vocabularies))
+    started = time.perf_counter()
+    with open(translations_path, 'r', encoding='utf-8') as translations_file:
+        pipeline.parse_translations_dict(translations_file.read())
+    parse_seconds = time.perf_counter() - started
+    store_path = os.path.join(directory, 'vocabulary.sqlite3')
+    vocabulary_store = pipeline.VocabularyStore(store_path)
+    vocabulary_store.import_translations_dict(translations_path)
+    vocabulary_store.close()
+    last_episode = max(vocabularies)
+    open_seconds = []  # открытие одной серии занимает миллисекунды, поэтому из нескольких замеров берется лучший
+    for _ in range(10):
+        started = time.perf_counter()
+        vocabulary_store = pipeline.VocabularyStore(store_path)
+        vocabulary_store.episode(last_episode)
+        open_seconds.append(time.perf_counter() - started)
+        vocabulary_store.close()
+    return {'full_parse_seconds': parse_seconds, 'single_episode_open_seconds': min(open_seconds)}
+
+
+# Поиск слов в OfflineDictionaryBackend
+def benchmark_offline_lookup(directory):
+    dictionary_path = os.path.join(directory, 'offline_dictionary.tsv')
+    pipeline.build_offline_dictionary('frequency_dictionary.txt', dictionary_path)
+    backend = pipeline.OfflineDictionaryBackend(dictionary_path)
+    with open('frequency_dictionary.txt', 'r', encoding='utf-8') as frequency_file:
+        words = [match.group(1) for match in map(pipeline.FREQUENCY_LINE_PATTERN.match, frequency_file) if match]
+    words += [word + 'zz' for word in words]  # половина слов в словаре не найдется
+    started = time.perf_counter()
+    found = sum(backend.lookup(word) is not None for word in words)
+    seconds = time.perf_counter() - started
+    backend.close()
+    return {'lookups_per_second': len(words) / seconds, 'found_share': found / len(words)}
+
+
+# Функция для вывода значения метрики
+def format_value(value):
+    return str(value) if isinstance(value, bool) else f'{value:.6g}'
+
+
+# Функция для сравнения результатов с базовыми: для скорости (метрики *_per_second) ухудшением считается падение больше
+# чем на tolerance, для времени (метрики *_seconds) - рост больше чем на tolerance и больше чем на
+# MIN_SECONDS_DIFFERENCE, а для доли найденных слов и совпадения результатов (*_share, same_result) - любое
+# уменьшение. Скорость прежней реализации (метрики legacy_*) не сравнивается. Возвращает список строк с описанием
+# ухудшений
+def compare_with_baseline(results, baseline_results, tolerance=TOLERANCE):
+    regressions = []
+    for benchmark_name, metrics in baseline_results.items():
+        for metric, baseline_value in metrics.items():
+            value = results.get(benchmark_name, {}).get(metric)
+            if value is None or metric.startswith('legacy_'):
+                continue
+            if isinstance(baseline_value, bool) or metric.endswith('_share'):
+                is_worse = value < baseline_value
+            elif metric.endswith('_per_second'):
+                is_worse = value < baseline_value * (1 - tolerance)
+            else:
+                is_worse = value > baseline_value * (1 + tolerance) and value - baseline_value > MIN_SECONDS_DIFFERENCE
+            if is_worse:
+                regressions.append(f'{benchmark_name}.{metric}: {format_value(value)} '
+                                   f'(базовое значение {format_value(baseline_value)})')
+    return regressions
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Замеры скорости этапов обработки')
+    argument_parser.add_argument('episodes_limit', nargs='?', type=int, help='число первых серий (по умолчанию все)')
+    argument_parser.add_argument('results_path', nargs='?', help='файл для записи результатов в формате json')
+    argument_parser.add_argument('--baseline', default=BASELINE_PATH, help='файл с базовыми результатами')
+    argument_parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                                 help='допустимое падение скорости (доля от базового значения)')
+    argument_parser.add_argument('--update-baseline', action='store_true',
+                                 help='записать результаты как базовые вместо сравнения с ними')
+    arguments = argument_parser.parse_args()
+    with open('transcript_dictionary.txt', 'r', encoding='utf-8') as transcript_file:
+        transcript_dict = ast.literal_eval(transcript_file.read())
+    with open('stopwords+words_already_known.txt', 'r', encoding='utf-8') as stop_file:
+        stopwords = re.findall(r'\'(\S*)\'', stop_file.readline())
+    with open('frequency_dictionary.txt', 'r', encoding='utf-8') as frequency_file:
+        frequency_entries = [match.groups() for match in map(pipeline.FREQUENCY_LINE_PATTERN.match, frequency_file)
+                             if match]
+    offline_translations = dict(reversed(frequency_entries))
+    episodes = dict(list(transcript_dict.items())[:arguments.episodes_limit])
+
+    pipeline.stats.reset()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        results['word_extraction'] = benchmark_word_extraction(episodes, stopwords)
+        results['preprocessing'] = benchmark_preprocessing(directory)
+        results['annotation'], annotated = benchmark_annotation(episodes, stopwords, directory)
+        results['translation_fetch'] = benchmark_translation_fetch(frequency_entries[:TRANSLATED_WORDS_COUNT])
+        results['transcript_parsing'] = benchmark_transcript_parsing()
+        vocabularies = {key: {word: offline_translations[word] for word in words_list if word in offline_translations}
+                        for key, words_list in sorted(annotated.items())}
+        results['vocabulary_loading'] = benchmark_vocabulary_loading(vocabularies, directory)
+        results['offline_lookup'] = benchmark_offline_lookup(directory)
+
+    print(f'Серий: {len(episodes)}')
+    for benchmark_name, metrics in results.items():
+        print(benchmark_name)
+        for metric, value in metrics.items():
+            print(f'    {metric:30} {format_value(value):>14}')
+    if arguments.results_path is not None:
+        pipeline.write_file_atomically(arguments.results_path,
+                                       json.dumps({'episodes': len(episodes), 'results': results,
+                                                   'stages': pipeline.stats.as_dict()['stages']},
+                                                  ensure_ascii=False, indent=1))
+    if arguments.update_baseline:
+        pipeline.write_file_atomically(arguments.baseline, json.dumps({'episodes': len(episodes), 'results': results},
+                                                                      ensure_ascii=False, indent=1) + '\n')
+        print(f'\nБазовые результаты записаны в {arguments.baseline}')
+    elif os.path.exists(arguments.baseline):
+        with open(arguments.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['episodes'] != len(episodes):
+            print(f'\nБазовые результаты получены для {baseline["episodes"]} серий, поэтому сравнение приблизительное')
+        regressions = compare_with_baseline(results, baseline['results'], arguments.tolerance)
+        if regressions:
+            print(f'\nУхудшения по сравнению с {arguments.baseline}:')
+            for regression in regressions:
+                print('    ' + regression)
+            sys.exit(1)
+        print(f'\nУхудшений по сравнению с {arguments.baseline} нет')
+    else:
+        print(f'\nФайла с базовыми результатами {arguments.baseline} нет: запустите замер с флагом --update-baseline')
@@ -0,0 +1,58 @@
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Общие средства для тестов и замеров скорости: локальный HTTP-сервер, который заменяет сайты и сервер Stanford, и
+# чтение сохраненных страниц сайтов из папки test_pages
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_pages')
+
+
+# Функция для чтения сохраненной страницы из папки test_pages (в байтах, как ее отдает сервер)
+def read_page(file_name):
+    with open(os.path.join(PAGES_DIR, file_name), 'rb') as page_file:
+        return page_file.read()
+
+
+# Функция для запуска локального сервера, который на каждый запрос отвечает результатом функции respond(обработчик):
+# кортежем (статус, тело ответа) или (статус, тело ответа, словарь дополнительных заголовков)
+def start_server(respond):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send(*respond(self))
+
+        def do_POST(self):
+            self.send(*respond(self))
+
+        def send(self, status, body, headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            for header, value in (headers or {}).items():
+                self.send_header(header, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+# Базовый класс локального сервера для тестов: подклассы задают метод respond (см. start_server), а адрес сервера
+# доступен в url. Сервер запускается при создании объекта и останавливается методом close
+class FixtureServer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.server, self.url = start_server(self.respond)
+
+    def respond(self, handler):
+        raise NotImplementedError
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,113 @@
+import json
+import os
+import re
+import tempfile
+import unittest
+
+import Python_Project_CL as pipeline
+from fixtures import FixtureServer
+
+# Проверка пакетной разметки серий (annotate_episodes) на локальном сервере, который вместо сервера Stanford CoreNLP
+# делит текст на предложения по знакам препинания и пустым строкам, а каждое слово размечает как существительное с
+# леммой в нижнем регистре. Запуск: python -m pytest test_annotation.py
+
+SENTENCE_PATTERN = re.compile(r'[^.!?\n]+(?:[.!?]+|(?=\n\n)|$)')
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+
+# Текст серии из слов, которые встречаются только в ней (напр., для серии 0102 - helloabac)
+def make_episode(key):
+    suffix = ''.join(chr(ord('a') + int(digit)) for digit in key)
+    return f'Hello{suffix} there{suffix}. Bye{suffix}', ['hello' + suffix, 'there' + suffix, 'bye' + suffix]
+
+
+class FakeCoreNLP(FixtureServer):
+    def __init__(self):
+        self.texts = []  # тексты всех запросов на разметку
+        self.failing_word = None  # на текст с этим словом сервер отвечает ошибкой не в формате json
+        super().__init__()
+
+    def respond(self, handler):
+        if handler.command == 'GET':  # pycorenlp проверяет, что сервер запущен
+            return 200, b''
+        text = handler.rfile.read(int(handler.headers['Content-Length'])).decode('utf-8')
+        with self.lock:
+            self.texts.append(text)
+        if self.failing_word and self.failing_word in text.lower():
+            return 500, b'<html>java.lang.OutOfMemoryError: Java heap space</html>'
+        sentences = []
+        for sentence_match in SENTENCE_PATTERN.finditer(text):
+            tokens = [{'index': index, 'word': token_match.group(), 'lemma': token_match.group().lower(),
+                       'pos': 'NN' if token_match.group().isalpha() else '.',
+                       'characterOffsetBegin': sentence_match.start() + token_match.start()}
+                      for index, token_match in enumerate(TOKEN_PATTERN.finditer(sentence_match.group()), start=1)]
+            if tokens:
+                sentences.append({'tokens': tokens, 'basicDependencies': []})
+        return 200, json.dumps({'sentences': sentences}).encode('utf-8')
+
+
+class AnnotateEpisodesTest(unittest.TestCase):
+    def setUp(self):
+        self.servers = [FakeCoreNLP(), FakeCoreNLP()]
+        for server in self.servers:
+            self.addCleanup(server.close)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint_dir = os.path.join(directory.name, 'annotations')
+        self.episodes = {}
+        self.expected = {}
+        for key in ['%02d%02d' % (season, episode) for season in (1, 2) for episode in range(1, 6)]:
+            self.episodes[key], self.expected[key] = make_episode(key)
+
+    def annotate(self, stopwords=(), batch_size=3):
+        return dict(pipeline.annotate_episodes(self.episodes, stopwords, [server.url for server in self.servers],
+                                               batch_size=batch_size, checkpoint_dir=self.checkpoint_dir))
+
+    def requests_count(self):
+        return sum(len(server.texts) for server in self.servers)
+
+    # Предложения из объединенного текста пакета относятся к своим сериям, а пакеты делятся между серверами
+    def test_batches_are_split_back_into_episodes(self):
+        self.assertEqual(self.annotate(), self.expected)
+        self.assertEqual(self.requests_count(), 4)
+        self.assertTrue(all(server.texts for server in self.servers))
+        joined_text = '\n\n'.join(self.episodes[key] for key in ('0101', '0102', '0103'))
+        self.assertIn(joined_text, [text for server in self.servers for text in server.texts])
+
+    # Повторный запуск берет результаты из сохраненных файлов и к серверам не обращается
+    def test_resume_from_checkpoints(self):
+        self.annotate()
+        requests_count = self.requests_count()
+        self.assertEqual(self.annotate(), self.expected)
+        self.assertEqual(self.requests_count(), requests_count)
+
+    # Ошибка в одном пакете не мешает сохранить остальные, а при следующем запуске обрабатывается только этот пакет
+    def test_failed_batch_does_not_lose_other_batches(self):
+        for server in self.servers:
+            server.failing_word = self.expected['0103'][0]
+        annotated = {}
+        with self.assertRaises(ValueError):
+            for key, words_list in pipeline.annotate_episodes(self.episodes, (), [s.url for s in self.servers],
+                                                              batch_size=2, checkpoint_dir=self.checkpoint_dir):
+                annotated[key] = words_list
+        self.assertEqual(sorted(annotated), sorted(set(self.episodes) - {'0103', '0104'}))
+        for server in self.servers:
+            server.failing_word = None
+            server.texts.clear()
+        self.assertEqual(self.annotate(batch_size=2), self.expected)
+        self.assertEqual([text for server in self.servers for text in server.texts],
+                         [self.episodes['0103'] + '\n\n' + self.episodes['0104']])
+
+    # Результаты, полученные с другим списком стоп-слов, не используются
+    def test_checkpoints_depend_on_stopwords(self):
+        self.annotate()
+        stopword = self.expected['0101'][0]
+        annotated = self.annotate([stopword])
+        self.assertEqual(annotated['0101'], self.expected['0101'][1:])
+        self.assertEqual(self.requests_count(), 8)
+        self.assertEqual(self.annotate(), self.expected)  # результаты для прежнего списка сохранились
+        self.assertEqual(self.requests_count(), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
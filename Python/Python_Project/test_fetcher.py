@@ -0,0 +1,195 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import requests as rq
+
+import Python_Project_CL as pipeline
+from fixtures import FixtureServer, read_page
+
+# Проверка параллельного перевода слов (PooledFetcher, fetch_translations) на локальных серверах, которые вместо
+# wooordhunt и multitran отдают сохраненные страницы из папки test_pages (для слов, которых там нет, - страницу
+# "слово не найдено" с ответом 200). Запуск: python -m pytest test_fetcher.py
+
+# Локальный сайт: запоминает все запросы, число одновременно обрабатываемых запросов и соединения клиентов, а для
+# отдельных адресов может возвращать заданную последовательность статусов (напр., 503, 503, 200)
+class FakeSite(FixtureServer):
+    def __init__(self, pages, not_found_page, get_word, delay=0.0):
+        self.pages = pages  # словарь вида {слово: страница}
+        self.not_found_page = not_found_page
+        self.get_word = get_word  # функция для получения слова из адреса запроса
+        self.delay = delay  # время обработки одного запроса (в секундах)
+        self.statuses = {}  # словарь вида {слово: [статусы следующих ответов]}
+        self.requests = []  # список вида [(время запроса, слово)]
+        self.client_ports = set()  # порты клиентов, т. е. разные соединения с сервером
+        self.active = 0
+        self.max_active = 0
+        super().__init__()
+
+    def respond(self, handler):
+        word = self.get_word(handler.path)
+        with self.lock:
+            self.requests.append((time.monotonic(), word))
+            self.client_ports.add(handler.client_address[1])
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            status = self.statuses[word].pop(0) if self.statuses.get(word) else 200
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        if status == 429:
+            return status, b'<html>Too Many Requests</html>', {'Retry-After': '1'}
+        if status in (404, 410):
+            return status, self.not_found_page
+        if status != 200:
+            return status, b'<html>Service Unavailable</html>'
+        return status, self.pages.get(word, self.not_found_page)
+
+    def requested_words(self):
+        return [word for _, word in self.requests]
+
+
+class FetchTranslationsTest(unittest.TestCase):
+    def setUp(self):
+        self.wooordhunt = FakeSite({'world': read_page('wooordhunt_world.html'),
+                                    'take': read_page('wooordhunt_take.html')},
+                                   read_page('wooordhunt_not_found.html'),
+                                   lambda path: unquote(urlsplit(path).path[len('/word/'):]))
+        self.multitran = FakeSite({'give up': read_page('multitran_give_up.html')},
+                                  read_page('multitran_not_found.html'),
+                                  lambda path: parse_qs(urlsplit(path).query)['s'][0])
+        for site in (self.wooordhunt, self.multitran):
+            self.addCleanup(site.close)
+        for name, url in (('WOOORDHUNT_URL', self.wooordhunt.url + '/word/'),
+                          ('MULTITRAN_URL', self.multitran.url + '/m.exe?l1=1&l2=2&s=')):
+            patcher = mock.patch.object(pipeline, name, url)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = pipeline.TranslationCache(os.path.join(directory.name, 'translation_cache.sqlite3'))
+        self.addCleanup(self.cache.close)
+
+    def make_fetcher(self, **options):
+        options = dict({'max_per_host': 4, 'rate_per_host': 1000, 'backoff': 0.01}, **options)
+        fetcher = pipeline.PooledFetcher(**options)
+        self.addCleanup(fetcher.close)
+        return fetcher
+
+    # Слово ищется сначала на wooordhunt и только если его там нет - на multitran
+    def test_wooordhunt_then_multitran(self):
+        translations = pipeline.fetch_translations(['world', 'give up', 'take', 'nothing'], self.cache,
+                                                   self.make_fetcher())
+        self.assertEqual(translations, {'world': ' |wɜːld|  – мир, свет, вселенная, земля, мировой, всемирный',
+                                        'give up': " [ɡɪv ˈʌp] - бросать; отказываться; сдаваться",
+                                        'take': ' (took, taken) |teɪk|  – брать, взять, принимать, принять, '
+                                                'захватывать'})
+        self.assertEqual(sorted(self.wooordhunt.requested_words()), ['give up', 'nothing', 'take', 'world'])
+        self.assertEqual(sorted(self.multitran.requested_words()), ['give up', 'nothing'])
+        for word in ('give up', 'nothing'):
+            wooordhunt_time = min(t for t, requested in self.wooordhunt.requests if requested == word)
+            multitran_time = min(t for t, requested in self.multitran.requests if requested == word)
+            self.assertLess(wooordhunt_time, multitran_time)
+        self.assertEqual(self.cache.get('world')[:2], (True, 'wooordhunt'))
+        self.assertEqual(self.cache.get('give up')[:2], (True, 'multitran'))
+        self.assertEqual(self.cache.get('nothing'), (True, None, None))  # слова нет ни на одном сайте
+
+    # Одновременно к одному сайту уходит не больше max_per_host запросов
+    def test_concurrency_per_host(self):
+        self.wooordhunt.delay = self.multitran.delay = 0.05
+        words = ['word%d' % i for i in range(12)]
+        pipeline.fetch_translations(words, self.cache, self.make_fetcher(max_per_host=2), max_workers=8)
+        self.assertEqual(self.wooordhunt.max_active, 2)
+        self.assertEqual(self.multitran.max_active, 2)
+
+    # Запросы к одному сайту отправляются не чаще rate_per_host в секунду (после начального запаса токенов)
+    def test_rate_per_host(self):
+        fetcher = self.make_fetcher(rate_per_host=10)  # запас - 10 токенов, поэтому на 20 запросов нужна 1 секунда
+        started = time.monotonic()
+        for _ in range(20):
+            fetcher.get(self.wooordhunt.url + '/word/world')
+        self.assertGreaterEqual(time.monotonic() - started, 0.95)
+
+    def test_token_bucket(self):
+        bucket = pipeline.TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.24)
+
+    # Ответы 429/5xx повторяются, пока не придет нормальный ответ
+    def test_retry_on_server_error(self):
+        self.wooordhunt.statuses['world'] = [503, 500]
+        response = self.make_fetcher().get(self.wooordhunt.url + '/word/world')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.wooordhunt.requested_words(), ['world'] * 3)
+
+    # При ответе 429 пауза перед повтором не меньше указанной сервером в заголовке Retry-After
+    def test_retry_after(self):
+        self.wooordhunt.statuses['world'] = [429]
+        response = self.make_fetcher().get(self.wooordhunt.url + '/word/world')
+        self.assertEqual(response.status_code, 200)
+        first, second = [t for t, _ in self.wooordhunt.requests]
+        self.assertGreaterEqual(second - first, 0.95)
+
+    # Если сервер отвечает ошибкой и на последнюю попытку, возникает исключение, а в кэш ничего не записывается
+    def test_retries_exhausted(self):
+        self.wooordhunt.statuses['world'] = [503] * 3
+        with self.assertRaises(rq.HTTPError):
+            self.make_fetcher(retries=2).get(self.wooordhunt.url + '/word/world')
+        self.wooordhunt.statuses['world'] = [503] * 3
+        self.multitran.statuses['world'] = [503] * 3
+        translations = pipeline.fetch_translations(['world', 'take'], self.cache, self.make_fetcher(retries=2))
+        self.assertEqual(list(translations), ['take'])
+        self.assertEqual(self.cache.get('world'), (False, None, None))
+        translations = pipeline.fetch_translations(['world', 'take'], self.cache, self.make_fetcher(retries=2))
+        self.assertEqual(list(translations), ['world', 'take'])  # при следующем запуске слово переводится
+
+    # Если wooordhunt недоступен, перевод с multitran возвращается, но не запоминается в кэше, а слово считается
+    # непереведенным, чтобы при следующем запуске его снова искали сначала на wooordhunt
+    def test_fallback_after_network_error_is_not_cached(self):
+        self.wooordhunt.statuses['give up'] = [503] * 3
+        failed_words = []
+        translations = pipeline.fetch_translations(['give up', 'world'], self.cache, self.make_fetcher(retries=2),
+                                                   failed_words=failed_words)
+        self.assertEqual(translations['give up'], " [ɡɪv ˈʌp] - бросать; отказываться; сдаваться")
+        self.assertEqual(failed_words, ['give up'])
+        self.assertEqual(self.cache.get('give up'), (False, None, None))
+        self.assertEqual(self.cache.get('world')[:2], (True, 'wooordhunt'))
+        backends = pipeline.get_network_backends(self.make_fetcher(retries=0).get)
+        self.wooordhunt.statuses['give up'] = [503]
+        self.assertEqual(pipeline.get_translations(['give up'], self.cache, backends),
+                         {'give up': " [ɡɪv ˈʌp] - бросать; отказываться; сдаваться"})
+        self.assertEqual(self.cache.get('give up'), (False, None, None))
+        pipeline.get_translations(['give up'], self.cache, backends)  # wooordhunt снова доступен
+        self.assertEqual(self.cache.get('give up')[:2], (True, 'multitran'))
+
+    # Ответ 404 или 410 означает, что слова в словаре нет: это запоминается в кэше, а не считается сетевой ошибкой
+    def test_not_found_status(self):
+        self.wooordhunt.statuses['nothing'] = [404]
+        self.multitran.statuses['nothing'] = [410]
+        failed_words = []
+        translations = pipeline.fetch_translations(['nothing', 'world'], self.cache, self.make_fetcher(),
+                                                   failed_words=failed_words)
+        self.assertEqual(list(translations), ['world'])
+        self.assertEqual(failed_words, [])
+        self.assertEqual(self.cache.get('nothing'), (True, None, None))
+        self.assertEqual(self.wooordhunt.requested_words().count('nothing'), 1)  # 404 не повторяется
+
+    # Для каждого сайта используется одна сессия, соединения которой переиспользуются между запросами
+    def test_session_reuse(self):
+        fetcher = self.make_fetcher(max_per_host=1)
+        for word in ('world', 'take', 'give up', 'nothing'):
+            fetcher.get(self.wooordhunt.url + '/word/' + word)
+        self.assertEqual(len(self.wooordhunt.client_ports), 1)
+        fetcher = self.make_fetcher(max_per_host=2)
+        pipeline.fetch_translations(['word%d' % i for i in range(20)], self.cache, fetcher, max_workers=8)
+        self.assertEqual(len(fetcher.hosts), 2)
+        self.assertLessEqual(len(self.multitran.client_ports), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+from email.utils import formatdate
+from unittest import mock
+from urllib.parse import urlsplit
+
+import Python_Project_CL as pipeline
+from fixtures import FixtureServer, read_page
+
+# Проверка скачивания текстов серий (scrape_transcripts) на локальном сервере, который отдает сохраненные страницы
+# сайта с текстами серий из папки test_pages с заголовками ETag и Last-Modified и отвечает 304 на условные запросы
+# к неизменившимся страницам. Запуск: python -m pytest test_scraper.py
+
+SITE_URL = 'https://bigbangtrans.wordpress.com'
+EPISODE_PAGES = {'/series-1-episode-1-pilot-episode/': 'transcript_0101.html',
+                 '/series-1-episode-2-the-big-bran-hypothesis/': 'transcript_0102.html',
+                 '/series-1-episode-3-the-fuzzy-boots-corollary/': 'transcript_0103.html'}
+
+
+class FakeTranscriptsSite(FixtureServer):
+    def __init__(self):
+        super().__init__()
+        self.pages = {path: read_page(file_name) for path, file_name in EPISODE_PAGES.items()}
+        self.pages['/'] = read_page('transcripts_index.html').replace(SITE_URL.encode(), self.url.encode())
+        self.last_modified = {path: formatdate(time.time() - 3600, usegmt=True) for path in self.pages}
+        self.delays = {}  # словарь вида {адрес страницы: задержка ответа в секундах}
+        self.requests = []  # список вида [(адрес страницы, заголовки запроса, статус ответа)]
+
+    def respond(self, handler):
+        path = urlsplit(handler.path).path
+        time.sleep(self.delays.get(path, 0))
+        page = self.pages[path]
+        headers = {'ETag': '"%s"' % hashlib.md5(page).hexdigest(), 'Last-Modified': self.last_modified[path]}
+        not_modified = handler.headers.get('If-None-Match') == headers['ETag'] or \
+            handler.headers.get('If-None-Match') is None and \
+            handler.headers.get('If-Modified-Since') == headers['Last-Modified']
+        status = 304 if not_modified else 200
+        with self.lock:
+            self.requests.append((path, dict(handler.headers), status))
+        return status, b'' if not_modified else page, headers
+
+    # Изменение страницы: меняются и ее текст, и заголовки ETag и Last-Modified
+    def edit_page(self, path, old, new):
+        self.pages[path] = self.pages[path].replace(old, new)
+        self.last_modified[path] = formatdate(time.time(), usegmt=True)
+
+    def episode_requests(self):
+        return {path: (headers, status) for path, headers, status in self.requests if path != '/'}
+
+
+class ScrapeTranscriptsTest(unittest.TestCase):
+    def setUp(self):
+        self.site = FakeTranscriptsSite()
+        self.addCleanup(self.site.close)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def scrape(self, parser=pipeline.TRANSCRIPT_PARSER, name='transcripts'):
+        fetcher = pipeline.PooledFetcher(rate_per_host=1000)
+        self.addCleanup(fetcher.close)
+        output_path = os.path.join(self.directory, name + '.txt')
+        changed_episodes = pipeline.scrape_transcripts(self.site.url + '/', output_path,
+                                                       os.path.join(self.directory, name + '.json'), fetcher,
+                                                       parser=parser)
+        with open(output_path, 'r', encoding='utf-8') as output_file:
+            return changed_episodes, output_file.read()
+
+    # Тексты серий записываются в порядке ссылок на сайте, даже если первая страница скачивается последней
+    def test_first_run_keeps_site_order(self):
+        self.site.delays['/series-1-episode-1-pilot-episode/'] = 0.2
+        changed_episodes, transcripts = self.scrape()
+        self.assertEqual(sorted(changed_episodes), ['Series 01 Episode 01 – Pilot Episode',
+                                                    'Series 01 Episode 02 – The Big Bran Hypothesis',
+                                                    'Series 01 Episode 03 – The Fuzzy Boots Corollary'])
+        self.assertEqual(changed_episodes[-1], 'Series 01 Episode 01 – Pilot Episode')
+        self.assertTrue(transcripts.startswith('Series 01 Episode 01 – Pilot Episode\n\nScene: A corridor at a '
+                                               'sperm bank.\nSheldon: So if a photon is directed'))
+        positions = [transcripts.index('Series 01 Episode 0%d' % number) for number in (1, 2, 3)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertIn('\nSheldon: You didn’t tell me I could.\n(They arrive at the apartment.)\n', transcripts)
+        self.assertNotIn('Blog at WordPress.com', transcripts)
+        self.assertEqual(transcripts.count('\n\n\n'), 3)
+
+    # Повторный запуск отправляет условные запросы, получает 304 и страницы заново не разбирает
+    def test_second_run_sends_conditional_requests(self):
+        _, transcripts = self.scrape()
+        first_requests = self.site.episode_requests()
+        self.site.requests.clear()
+        with mock.patch.object(pipeline, 'parse_transcript_page', wraps=pipeline.parse_transcript_page) as parse:
+            changed_episodes, second_transcripts = self.scrape()
+        self.assertEqual(changed_episodes, [])
+        self.assertEqual(second_transcripts, transcripts)
+        parse.assert_not_called()
+        second_requests = self.site.episode_requests()
+        self.assertEqual(sorted(second_requests), sorted(EPISODE_PAGES))
+        for path, (headers, status) in second_requests.items():
+            self.assertEqual(status, 304)
+            first_headers = first_requests[path][0]
+            self.assertNotIn('If-None-Match', first_headers)
+            self.assertTrue(headers['If-None-Match'].startswith('"'))
+            self.assertEqual(headers['If-Modified-Since'], self.site.last_modified[path])
+
+    # После изменения одной страницы заново скачивается и разбирается только она
+    def test_edited_page_is_downloaded_again(self):
+        self.scrape()
+        self.site.edit_page('/series-1-episode-2-the-big-bran-hypothesis/', b'tell Penny', b'tell Penny anything')
+        self.site.requests.clear()
+        with mock.patch.object(pipeline, 'parse_transcript_page', wraps=pipeline.parse_transcript_page) as parse:
+            changed_episodes, transcripts = self.scrape()
+        self.assertEqual(changed_episodes, ['Series 01 Episode 02 – The Big Bran Hypothesis'])
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual({path: status for path, (_, status) in self.site.episode_requests().items()},
+                         {'/series-1-episode-1-pilot-episode/': 304,
+                          '/series-1-episode-2-the-big-bran-hypothesis/': 200,
+                          '/series-1-episode-3-the-fuzzy-boots-corollary/': 304})
+        self.assertIn('Leonard: I never said you couldn’t tell Penny anything.', transcripts)
+        self.assertTrue(transcripts.startswith('Series 01 Episode 01 – Pilot Episode\n\n'))
+
+    # Разбор страниц через lxml и через html.parser дает одинаковый текст
+    @unittest.skipUnless(pipeline.TRANSCRIPT_PARSER == 'lxml', 'lxml не установлен')
+    def test_lxml_and_html_parser_agree(self):
+        for file_name in EPISODE_PAGES.values():
+            page = read_page(file_name).decode('utf-8')
+            self.assertEqual(pipeline.parse_transcript_page(page, 'lxml'),
+                             pipeline.parse_transcript_page(page, 'html.parser'))
+        self.assertEqual(self.scrape('lxml', 'lxml_transcripts')[1],
+                         self.scrape('html.parser', 'html_parser_transcripts')[1])
+
+
+if __name__ == '__main__':
+    unittest.main()